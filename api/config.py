@@ -9,6 +9,7 @@ BASE_DIR = Path(__file__).resolve().parent
 #DATA_DIR = os.path.join(BASE_DIR, "data")
 
 #load_dotenv(os.path.join(BASE_DIR, ".env"))
+load_dotenv()
 #POSTGRES_URI = os.getenv("POSTGRES_URI")
 #DB_SCHEMA = os.getenv("DB_SCHEMA")
 
@@ -19,4 +20,35 @@ RELOAD = True
 
 
 LATTITUDE = 47.278
-LONGITUDE = 0.6455
\ No newline at end of file
+LONGITUDE = 0.6455
+
+
+# Analyse de sentiment
+SENTIMENT_MODEL_NAME = os.getenv("SENTIMENT_MODEL_NAME", "tabularisai/multilingual-sentiment-analysis")
+SENTIMENT_DEVICE = os.getenv("SENTIMENT_DEVICE", "cpu")
+SENTIMENT_WARMUP = os.getenv("SENTIMENT_WARMUP", "false").lower() == "true"
+SENTIMENT_BATCH_SIZE = int(os.getenv("SENTIMENT_BATCH_SIZE", "32"))
+SENTIMENT_MAX_LENGTH = int(os.getenv("SENTIMENT_MAX_LENGTH", "384"))
+SENTIMENT_BACKEND = os.getenv("SENTIMENT_BACKEND", "torch")  # torch, torch_int8 ou onnx
+SENTIMENT_ARTIFACTS_DIR = os.getenv("SENTIMENT_ARTIFACTS_DIR", os.path.join(BASE_DIR, "models", "sentiment"))
+
+
+# Embedding
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "paraphrase-multilingual-MiniLM-L12-v2")
+EMBEDDING_WARMUP = os.getenv("EMBEDDING_WARMUP", "false").lower() == "true"
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_PROCESSES = int(os.getenv("EMBEDDING_PROCESSES", "1"))  # processus d'encodage du backfill
+EMBEDDING_TORCH_THREADS = int(os.getenv("EMBEDDING_TORCH_THREADS", "0"))  # par processus, 0 = cœurs / processus
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "1024"))
+EMBEDDING_CACHE_TTL = float(os.getenv("EMBEDDING_CACHE_TTL", "86400"))  # en secondes, 0 pour ne jamais expirer
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "")  # fichier SQLite partagé entre workers, vide pour désactiver
+EMBEDDING_CHUNKING = os.getenv("EMBEDDING_CHUNKING", "false").lower() == "true"  # un vecteur par fenêtre pour les messages longs
+EMBEDDING_CHUNK_OVERLAP = int(os.getenv("EMBEDDING_CHUNK_OVERLAP", "32"))
+EMBEDDING_COMPACT = os.getenv("EMBEDDING_COMPACT", "")  # "", halfvec ou bit : copie compacte pour la recherche des candidats
+EMBEDDING_RESCORE_FACTOR = int(os.getenv("EMBEDDING_RESCORE_FACTOR", "4"))  # candidats recalculés en float32 = limit * facteur
+EMBEDDING_EF_SEARCH = int(os.getenv("EMBEDDING_EF_SEARCH", "40"))  # index HNSW : candidats examinés par recherche
+EMBEDDING_IVFFLAT_PROBES = int(os.getenv("EMBEDDING_IVFFLAT_PROBES", "0"))  # index IVFFlat : listes parcourues, 0 = valeur du serveur
+EMBEDDING_OVERSAMPLING = int(os.getenv("EMBEDDING_OVERSAMPLING", "10"))  # candidats = limit * facteur quand un cours est filtré
+EMBEDDING_MAX_CANDIDATES = int(os.getenv("EMBEDDING_MAX_CANDIDATES", "1000"))  # au-delà, pré-filtre exact du cours
+EMBEDDING_SEARCH_BACKEND = os.getenv("EMBEDDING_SEARCH_BACKEND", "postgres")  # postgres ou mmap (voir scripts/export_vector_index.py)
+EMBEDDING_MMAP_PATH = os.getenv("EMBEDDING_MMAP_PATH", os.path.join(BASE_DIR.parent, "data", "embedding_index"))  # sans extension
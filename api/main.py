@@ -5,12 +5,13 @@ from fastapi.middleware.cors import CORSMiddleware
 import pandas as pd
 
 from fastapi import FastAPI, Request, Depends
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 import os
 import sys
+import json
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from api.services import embedding
@@ -19,6 +20,10 @@ import config
 from api.services.database_helper import connect_to_db, get_all_vectors_from_db, get_similar_documents, get_all_data_similar_documents, get_similars_messages_from_vector # Commented out as these are used in endpoints.py
 from api.services.mongo_helper import get_data_for_thread
 from api.services import sentiment as sentiment_analysis_service
+from api.services.sentiment_store import get_cache_stats
+from api.services.embedding_cache import QueryEmbeddingCache
+from api.services.embedding_store import course_columns_pending
+from api.services.sentiment_aggregates import get_thread_sentiment_stats, get_course_sentiment_weekly
 from api.services import clustering_module
 from api.services.clustering_participants import run_participant_clustering
 import psycopg2
@@ -76,6 +81,19 @@ async def periodic_update(request: Request, auth: dict = Depends(get_api_key)):
     return JSONResponse(content={"message": "Hello World!"})
 
 
+@app.get("/api/sentiment_model", tags=["check"], summary="État du modèle de sentiment", description="Route qui indique si le modèle de sentiment est chargé, sur quel device, son temps de chargement, sa mémoire et les compteurs du cache de résultats.", 
+         responses={200: {"description": "Informations sur le modèle de sentiment."}})
+async def get_sentiment_model_stats(request: Request, auth: dict = Depends(get_api_key)):
+    registry = sentiment_analysis_service.SentimentModelRegistry.get_instance()
+    return JSONResponse(content={**registry.stats(), "cache": get_cache_stats()})
+
+
+@app.get("/api/embedding_cache", tags=["check"], summary="État du cache des questions", description="Route qui indique la taille du cache des vecteurs de questions, ses compteurs de succès, d'échecs et d'évictions, et l'état de chargement du modèle d'embedding.", 
+         responses={200: {"description": "Statistiques du cache des vecteurs de questions."}})
+async def get_embedding_cache_stats(request: Request, auth: dict = Depends(get_api_key)):
+    return JSONResponse(content={**QueryEmbeddingCache.get_instance().stats(), "model": embedding.embedding_model_stats()})
+
+
 @app.get(f"/api/similars", tags=["rag"], summary="Récupération de documents similaires", description="Route qui permet de récupérer les messages similaires à un message donné.", 
          responses={200: {"description": "Les messages similaires ont été récupérés avec succès."}, 404: {"description": "Aucun message similaire trouvé."}, 500: {"description": "Erreur lors de la récupération des messages similaires."}},
          response_model=Dict[str, str])
@@ -114,7 +132,52 @@ async def analyse_thread_sentiment(request: Request, id:str, auth: dict = Depend
         return JSONResponse(content={"error": "MONGO_URL environment variable is not set"}, status_code=500)
     result = sentiment_analysis_service.get_message_for_thread(id, mongo_url, "G1")
     return JSONResponse(content=result)
+
+@app.post("/api/thread_sentiment/stream", tags=["Analyse de sentiments"], summary="Analyse de sentiments des threads en flux", description="Route qui renvoie le sentiment de chaque message d'un thread dès que son lot est calculé, en JSON délimité par des retours à la ligne (format=ndjson) ou en Server-Sent Events (format=sse).", 
+          responses={200: {"description": "Flux des résultats de l'analyse de sentiment."}, 400: {"description": "Format inconnu."}, 500: {"description": "Erreur lors de l'analyse de sentiment."}})
+async def stream_thread_sentiment(request: Request, id: str, format: str = "ndjson", auth: dict = Depends(get_api_key)):
+    mongo_url = os.getenv("MONGO_URL")
+    if not mongo_url:
+        return JSONResponse(content={"error": "MONGO_URL environment variable is not set"}, status_code=500)
+    if format not in ("ndjson", "sse"):
+        return JSONResponse(content={"error": "Unknown format, expected 'ndjson' or 'sse'."}, status_code=400)
+
+    def generate():
+        for result in sentiment_analysis_service.iter_message_for_thread(id, mongo_url, "G1"):
+            line = json.dumps(result, default=str, ensure_ascii=False)
+            yield f"data: {line}\n\n" if format == "sse" else f"{line}\n"
+        if format == "sse":
+            yield "event: end\ndata: {}\n\n"
+
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(generate(), media_type=media_type)
  
+@app.get("/api/sentiment/thread/{thread_id}", tags=["Analyse de sentiments"], summary="Sentiment agrégé d'un thread", description="Route qui renvoie la répartition des labels et le score moyen d'un thread à partir des sentiments déjà calculés.", 
+         responses={200: {"description": "Agrégats du thread."}, 404: {"description": "Aucun sentiment calculé pour ce thread."}, 500: {"description": "Erreur de connexion à la base de données."}})
+def get_thread_sentiment_aggregate(request: Request, thread_id: str, auth: dict = Depends(get_api_key)):
+    conn = connect_to_db()
+    if not conn:
+        return JSONResponse(content={"error": "Failed to connect to the database."}, status_code=500)
+    model_key = sentiment_analysis_service.SentimentModelRegistry.get_instance().cache_key
+    stats = get_thread_sentiment_stats(conn, thread_id, model_key)
+    conn.close()
+    if not stats:
+        return JSONResponse(content={"error": "No sentiment computed for this thread."}, status_code=404)
+    return JSONResponse(content={"error": None, "data": stats}, status_code=200)
+
+@app.get("/api/sentiment/course", tags=["Analyse de sentiments"], summary="Sentiment hebdomadaire d'un cours", description="Route qui renvoie, semaine par semaine, la répartition des labels et le score moyen des messages d'un cours.", 
+         responses={200: {"description": "Agrégats hebdomadaires du cours."}, 404: {"description": "Aucun sentiment calculé pour ce cours."}, 500: {"description": "Erreur de connexion à la base de données."}})
+def get_course_sentiment_aggregate(request: Request, course_name: str, auth: dict = Depends(get_api_key)):
+    conn = connect_to_db()
+    if not conn:
+        return JSONResponse(content={"error": "Failed to connect to the database."}, status_code=500)
+    model_key = sentiment_analysis_service.SentimentModelRegistry.get_instance().cache_key
+    weekly = get_course_sentiment_weekly(conn, course_name, model_key)
+    conn.close()
+    if not weekly:
+        return JSONResponse(content={"error": "No sentiment computed for this course."}, status_code=404)
+    return JSONResponse(content={"error": None, "data": weekly}, status_code=200)
+
 @app.get("/api/answers", tags=["rag"], summary="Récupération de documents par rapport à une question", description="Route qui permet de récupérer les threads ayant des messages similaires à une question.", 
          responses={200: {"description": "Les messages similaires ont été récupérés avec succès."}, 404: {"description": "Aucun message similaire trouvé."}, 500: {"description": "Erreur lors de la récupération des messages similaires."}}, 
          response_model=Dict[str, str])
@@ -132,20 +195,25 @@ def get_threads_similars_for_text(request: Request, text: str, course_name: str
         JsonReponse: a JSON response containing an eventual error message and the data containing the similar messages and their similarity scores.
     """
     from api.services.embedding import embedding_message
-    conn = connect_to_db()
-    if conn:
+    # Avec l'index mmap, la recherche et les scores sont calculés dans le processus, sans connexion PostgreSQL
+    mmap_backend = config.EMBEDDING_SEARCH_BACKEND == "mmap"
+    conn = None if mmap_backend else connect_to_db()
+    if conn or mmap_backend:
         vector = embedding_message(text)
         if vector:
             similar_docs = get_similars_messages_from_vector(conn, vector, limit=10, course_name=course_name)
             if similar_docs:
                 similar_docs = get_all_data_similar_documents(similar_docs, os.getenv("MONGO_URL"), "G1", conn)
-                conn.close()  
+                if conn:
+                    conn.close()  
                 return JSONResponse(content={"error": None, "data": similar_docs}, status_code=200)
             else:
-                conn.close()  
+                if conn:
+                    conn.close()  
                 return JSONResponse(content={"error": "No similar messages found."}, status_code=404)  
         else:
-            conn.close()  
+            if conn:
+                conn.close()  
             return JSONResponse(content={"error": "Failed to create embedding."}, status_code=500)
         
     else:
@@ -212,6 +280,12 @@ if conn:
         import sys
         sys.exit(1)
 
+    # Colonnes thread/cours de embedding, lues par la recherche de similarité et le clustering
+    # (ajoutées et remplies par la migration, pas au démarrage de chaque worker)
+    if course_columns_pending(conn):
+        print("[WARNING] Des embeddings n'ont pas de cours renseigné (colonnes course_id / course_name absentes ou incomplètes). "
+              "Lancer la migration : python api/services/embedding.py migrate")
+
     # Vérification participant_clusters
     participant_tables = ["participant_clusters", "participant_cluster_info"]
     missing_participant = [t for t in participant_tables if not check_table_exists(conn, t)]
@@ -227,6 +301,12 @@ if conn:
         from api.services.clustering_module import reload_or_recalculate
         reload_or_recalculate(force=True)
     conn.close()
+
+    # Préchargement des modèles (sinon chargés à la première requête qui les utilise)
+    if config.SENTIMENT_WARMUP:
+        print(f"[INFO] Préchargement du modèle de sentiment : {sentiment_analysis_service.warmup_sentiment_model()}")
+    if config.EMBEDDING_WARMUP:
+        print(f"[INFO] Préchargement du modèle d'embedding : {embedding.warmup()}")
 else:
     print("[CRITICAL] Impossible de se connecter à la base de données. Arrêt du serveur FastAPI.")
     import sys
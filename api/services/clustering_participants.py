@@ -4,9 +4,6 @@ import numpy as np
 import pandas as pd
 from dotenv import load_dotenv
 from pymongo import MongoClient
-from sklearn.preprocessing import StandardScaler
-from sklearn.cluster import KMeans
-from sklearn.metrics.pairwise import cosine_similarity
 from psycopg2.extras import execute_values
 import psycopg2
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
@@ -56,15 +53,12 @@ def fetch_embeddings_from_postgres():
     conn = connect_to_db()
     query = """
     SELECT 
-        embedding.id AS embedding_id,
-        embedding.vector,
-        embedding.thread_id,
-        t1.course_id,
-        c.name AS course_name
+        id AS embedding_id,
+        vector,
+        thread_id,
+        course_id,
+        course_name
     FROM embedding
-    LEFT JOIN threads t1 ON t1.id = embedding.id
-    LEFT JOIN threads t2 ON t2.id = embedding.thread_id
-    LEFT JOIN courses c ON c.id = COALESCE(t1.course_id, t2.course_id)
     """
     df = pd.read_sql(query, conn)
     conn.close()
@@ -106,12 +100,14 @@ def prepare_clustering_data(user_profiles, user_embeddings):
     df_subset = user_profiles[user_profiles['user_id'].isin(users_with_embedding)].copy()
     embedding_matrix = np.array([user_embeddings[uid] for uid in df_subset['user_id']])
     engagement_features = df_subset[['votes.count', 'comments_count', 'nb_messages']].fillna(0).values
+    from sklearn.preprocessing import StandardScaler
     scaler = StandardScaler()
     engagement_scaled = scaler.fit_transform(engagement_features)
     X_combined = np.hstack([embedding_matrix, engagement_scaled * 0.5])
     return X_combined, df_subset
 
 def cluster_participants(X, df_subset, k=5):
+    from sklearn.cluster import KMeans
     kmeans = KMeans(n_clusters=k, random_state=42, n_init=10)
     labels = kmeans.fit_predict(X)
     df_subset = df_subset.copy()
@@ -258,6 +254,7 @@ def find_similar_users(user_id, df_clustered, X, top_n=5):
     user_cluster = df_clustered.loc[user_idx, 'cluster']
     same_cluster_indices = df_clustered[df_clustered['cluster'] == user_cluster].index
     user_vector = X[user_idx].reshape(1, -1)
+    from sklearn.metrics.pairwise import cosine_similarity
     similarities = cosine_similarity(user_vector, X[same_cluster_indices]).flatten()
     sim_df = pd.DataFrame({
         'user_id': df_clustered.loc[same_cluster_indices, 'user_id'].values,
@@ -4,6 +4,9 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(
 from dotenv import load_dotenv
 import psycopg2
 from api.services.mongo_helper import get_data_for_thread
+from api import config
+from api.services.embedding_store import COMPACT_COLUMNS, set_search_params
+from api.services.similarity import SimilarDocument, parse_vector_send
 import csv
 from datetime import datetime
 
@@ -56,7 +59,141 @@ def get_all_vectors_from_db(conn, limit=10000000000):
         print(f"Error fetching vectors from the database: {e}")
         return []
     
-def get_similar_documents(conn, id, limit=5):
+def build_similarity_query(course_name=None, compact=None, chunking=None, exclude_id=None, exact=False, with_vectors=False):
+    """
+    Construit la requête des documents les plus proches d'un vecteur.
+
+    Les candidats sont obtenus par ORDER BY embedding.vector <=> vecteur LIMIT n, forme que l'index ANN
+    (HNSW ou IVFFlat) sait servir. Le cours est lu dans la colonne embedding.course_name : le filtre
+    est appliqué dans la recherche elle-même, sans jointure sur threads/courses, et peut utiliser
+    l'index partiel du cours (voir create_course_vector_indexes) ou l'index B-tree sur course_name.
+    Avec exact=True, les documents du cours sont triés sans index ANN (parcours exact du cours).
+
+    Args:
+        course_name (str, optional): Ne garder que les documents de ce cours. Defaults to None.
+        compact (dict, optional): Entrée de COMPACT_COLUMNS pour chercher les candidats sur la copie compacte. Defaults to None.
+        chunking (bool, optional): Chercher aussi dans embedding_chunk. Defaults to config.EMBEDDING_CHUNKING.
+        exclude_id (str, optional): Document à exclure des résultats. Defaults to None.
+        exact (bool, optional): Trier tous les documents du cours sans index ANN. Defaults to False.
+        with_vectors (bool, optional): Renvoyer aussi le vecteur de chaque document, au format binaire (vector_send). Defaults to False.
+
+    Returns:
+        str: Requête à paramètres nommés (vector, candidates, rescore, course_name, exclude_id, limit), qui renvoie
+            (id, similarité, nom du cours, thread[, vecteur binaire]) du plus proche au plus lointain.
+    """
+    chunking = config.EMBEDDING_CHUNKING if chunking is None else chunking
+    vector_column = ",\n            vector_send(e.vector) AS vector" if with_vectors else ""
+    filters = []
+    if course_name:
+        filters.append("e.course_name = %(course_name)s")
+    if exclude_id:
+        filters.append("e.id != %(exclude_id)s")
+    where_clause = ("WHERE " + " AND ".join(filters)) if filters else ""
+
+    if compact and not exact:
+        doc_hits = f"""
+            SELECT id, vector <=> %(vector)s::vector AS distance
+            FROM (
+                SELECT e.id, e.vector
+                FROM embedding e
+                {where_clause}
+                ORDER BY e.{compact['distance'].replace('%s', '%(vector)s')}
+                LIMIT %(rescore)s
+            ) candidates
+            ORDER BY vector <=> %(vector)s::vector
+            LIMIT %(candidates)s"""
+    else:
+        doc_hits = f"""
+            SELECT e.id, e.vector <=> %(vector)s::vector AS distance
+            FROM embedding e
+            {where_clause}
+            ORDER BY e.vector <=> %(vector)s::vector
+            LIMIT %(candidates)s"""
+
+    hits = doc_hits
+    if chunking:
+        chunk_source = "embedding_chunk ch" if not filters else "embedding_chunk ch JOIN embedding e ON e.id = ch.id"
+        # Un document long est retrouvé par sa meilleure fenêtre, même si son début ne ressemble pas à la question
+        hits = f"""
+            SELECT id, min(distance) AS distance
+            FROM (
+                ({doc_hits})
+                UNION ALL
+                (SELECT ch.id, ch.vector <=> %(vector)s::vector AS distance
+                FROM {chunk_source}
+                {where_clause}
+                ORDER BY ch.vector <=> %(vector)s::vector
+                LIMIT %(candidates)s)
+            ) all_hits
+            GROUP BY id"""
+
+    query = f"""
+        WITH hits AS ({hits}
+        )
+        SELECT 
+            e.id,
+            1 - h.distance AS similarity,
+            e.course_name,
+            COALESCE(e.thread_id, e.id) AS thread_id{vector_column}
+        FROM hits h
+        JOIN embedding e ON e.id = h.id
+        ORDER BY h.distance
+        LIMIT %(limit)s;
+        """
+    return query
+
+def _to_similar_document(row):
+    """Convertit une ligne de build_similarity_query en SimilarDocument."""
+    id, score, course, thread_id = row[:4]
+    return SimilarDocument(id, score, course, thread_id, parse_vector_send(row[4]) if len(row) > 4 else None)
+
+def _search_similar(conn, vector, limit, course_name=None, compact=None, exclude_id=None, ef_search=None, probes=None, with_vectors=False):
+    """
+    Cherche les documents les plus proches d'un vecteur par l'index ANN, avec sur-échantillonnage itératif
+    quand un filtre (cours, document exclu) écarte une partie des candidats parcourus par l'index global.
+    Un cours qui a son propre index partiel est servi directement par celui-ci.
+
+    Les candidats sont multipliés par 4 à chaque passe tant que le filtre n'en laisse pas assez,
+    jusqu'à config.EMBEDDING_MAX_CANDIDATES ; au-delà, le cours est pré-filtré et parcouru exactement.
+
+    Returns:
+        list[SimilarDocument]: Documents du plus proche au plus lointain.
+    """
+    compact = COMPACT_COLUMNS.get(config.EMBEDDING_COMPACT if compact is None else compact)
+    filtered = bool(course_name or exclude_id)
+    candidates = limit * config.EMBEDDING_OVERSAMPLING if course_name else limit + (1 if exclude_id else 0)
+    params = {
+        "vector": vector,
+        "course_name": course_name,
+        "exclude_id": exclude_id,
+        "limit": limit,
+    }
+    cursor = conn.cursor()
+    while True:
+        params["candidates"] = candidates
+        params["rescore"] = candidates * config.EMBEDDING_RESCORE_FACTOR
+        # HNSW ne renvoie pas plus de ef_search lignes : l'élargir au nombre de candidats demandés
+        search_width = max(ef_search or config.EMBEDDING_EF_SEARCH, params["rescore"] if compact else candidates)
+        set_search_params(cursor, min(search_width, 1000), probes or config.EMBEDDING_IVFFLAT_PROBES)
+        cursor.execute(build_similarity_query(course_name, compact, exclude_id=exclude_id, with_vectors=with_vectors), params)
+        rows = cursor.fetchall()
+        if len(rows) >= limit or not filtered:
+            return [_to_similar_document(row) for row in rows]
+        if candidates >= config.EMBEDDING_MAX_CANDIDATES:
+            break
+        candidates = min(candidates * 4, config.EMBEDDING_MAX_CANDIDATES)
+
+    if not course_name:
+        return [_to_similar_document(row) for row in rows]
+    # Cours trop petit pour être trouvé par l'index : parcours exact de ses documents
+    params["candidates"] = limit + 1
+    cursor.execute("SET LOCAL enable_indexscan = off")
+    cursor.execute(build_similarity_query(course_name, exclude_id=exclude_id, exact=True, with_vectors=with_vectors), params)
+    rows = cursor.fetchall()
+    cursor.execute("SET LOCAL enable_indexscan = on")
+    return [_to_similar_document(row) for row in rows]
+
+def get_similar_documents(conn, id, limit=5, ef_search=None, probes=None, with_vectors=False):
     """
     Récupère les documents similaires à un document donné.
     
@@ -64,92 +201,81 @@ def get_similar_documents(conn, id, limit=5):
         conn: Connection à la base de données.
         id: ID du document à comparer.
         limit: Nombre de documents similaires à récupérer.
+        ef_search: Candidats examinés par l'index HNSW (optionnel). Defaults to config.EMBEDDING_EF_SEARCH.
+        probes: Listes parcourues par l'index IVFFlat (optionnel). Defaults to config.EMBEDDING_IVFFLAT_PROBES.
+        with_vectors: Charger aussi le vecteur de chaque document (optionnel). Defaults to False.
         
     Returns:
-        list: Liste de documents similaires.
+        list[SimilarDocument]: Liste de documents similaires.
     """
     try:
         query = """
-        WITH reference AS (
-            SELECT 
-                e.vector AS ref_vector,
-                c.name AS course_name
-            FROM embedding e
-            JOIN threads t ON t.id = e.id
-            JOIN courses c ON c.id = t.course_id
-            WHERE e.id = %s
-        )
         SELECT 
-            e.id,
-            e.vector,
-            1 - (e.vector <=> r.ref_vector) AS similarity,
-            c.name
+            e.vector::text,
+            e.course_name
         FROM embedding e
-        LEFT JOIN threads t1 ON t1.id = e.id
-        LEFT JOIN threads t2 ON t2.id = e.thread_id
-        LEFT JOIN courses c ON c.id = COALESCE(t1.course_id, t2.course_id)
-        JOIN reference r ON c.name = r.course_name
-        WHERE e.id != %s
-        ORDER BY similarity DESC
-        LIMIT %s;
+        WHERE e.id = %s
         """
         cursor = conn.cursor()
-        cursor.execute(query, (id, id, limit))
-        return cursor.fetchall()
+        cursor.execute(query, (id,))
+        reference = cursor.fetchone()
+        if not reference:
+            return []
+        vector, course_name = reference
+        return _search_similar(conn, vector, limit, course_name=course_name, exclude_id=id, ef_search=ef_search, probes=probes,
+                               with_vectors=with_vectors)
     except Exception as e:
         print(f"Error getting similar documents: {e}")
         return []
     
-def get_similars_messages_from_vector(conn, vector, limit=5, course_name=None):
+def get_similars_messages_from_vector(conn, vector, limit=5, course_name=None, compact=None, ef_search=None, probes=None, with_vectors=False,
+                                      backend=None):
     """
     Récupère les messages (ou threads) similaires à un vecteur donné, avec ou sans filtrage par cours.
+
+    Si config.EMBEDDING_CHUNKING est activé, les fenêtres des messages longs (embedding_chunk) sont
+    aussi comparées, et chaque document garde la meilleure similarité entre son vecteur et ses fenêtres.
+    Avec une copie compacte (halfvec ou bit), les candidats sont cherchés sur la copie compacte puis
+    leur similarité est recalculée sur le vecteur float32 : les scores renvoyés restent exacts.
+    Avec le backend "mmap", la recherche est faite dans le processus sur l'index exporté par
+    scripts/export_vector_index.py (voir MemmapVectorIndex), sans requête PostgreSQL ; les fenêtres
+    et la copie compacte n'y sont pas utilisées.
     
     Args:
         conn: Connexion à la base de données.
         vector: Vecteur à comparer.
         limit: Nombre d'éléments similaires à récupérer.
         course_name: Nom du cours (optionnel). Si None, cherche dans tous les cours.
+        compact: "halfvec", "bit" ou "" pour une recherche exacte (optionnel). Defaults to config.EMBEDDING_COMPACT.
+        ef_search: Candidats examinés par l'index HNSW (optionnel). Defaults to config.EMBEDDING_EF_SEARCH.
+        probes: Listes parcourues par l'index IVFFlat (optionnel). Defaults to config.EMBEDDING_IVFFLAT_PROBES.
+        with_vectors: Charger aussi le vecteur de chaque élément (optionnel). Defaults to False.
+        backend: "postgres" ou "mmap" (optionnel). Defaults to config.EMBEDDING_SEARCH_BACKEND.
         
     Returns:
-        list: Liste d'éléments similaires.
+        list[SimilarDocument]: Liste d'éléments similaires.
     """
+    if (backend or config.EMBEDDING_SEARCH_BACKEND) == "mmap":
+        from api.services.embedding_mmap import MemmapVectorIndex
+        try:
+            return MemmapVectorIndex.get_instance().search(vector, limit, course_name=course_name, with_vectors=with_vectors)
+        except (OSError, ValueError) as e:
+            # Index absent, en cours de remplacement ou de dimension différente : recherche dans PostgreSQL
+            print(f"Index mmap inutilisable ({e}), recherche dans PostgreSQL")
+    # Avec le backend mmap, l'appelant peut ne pas avoir ouvert de connexion
+    owned = conn is None
+    conn = conn or connect_to_db()
+    if conn is None:
+        return []
     try:
-        print(vector)
-        
-        # Clause WHERE dynamique
-        where_clause = "WHERE c.name = %s" if course_name else ""
-        
-        query = f"""
-        WITH embeddings_with_course AS (
-            SELECT 
-                e.id,
-                e.vector,
-                c.name AS course_name
-            FROM embedding e
-            LEFT JOIN threads t1 ON t1.id = e.id
-            LEFT JOIN threads t2 ON t2.id = e.thread_id
-            LEFT JOIN courses c ON c.id = COALESCE(t1.course_id, t2.course_id)
-            {where_clause}
-        )
-        SELECT 
-            id,
-            vector,
-            1 - (vector <=> %s::vector) AS similarity
-        FROM embeddings_with_course
-        ORDER BY similarity DESC
-        LIMIT %s;
-        """
-        
-        cursor = conn.cursor()
-        if course_name:
-            cursor.execute(query, (course_name, vector, limit))
-        else:
-            cursor.execute(query, (vector, limit))
-        
-        return cursor.fetchall()
+        return _search_similar(conn, vector, limit, course_name=course_name, compact=compact, ef_search=ef_search, probes=probes,
+                               with_vectors=with_vectors)
     except Exception as e:
         print(f"Error getting similar messages: {e}")
         return []
+    finally:
+        if owned:
+            conn.close()
 
 def get_similarity_score_between_vectors(conn, id1, id2):
     """
@@ -159,7 +285,22 @@ def get_similarity_score_between_vectors(conn, id1, id2):
         conn (conn): Connection à la base de données.
         id1 (str): ID du premier vecteur.
         id2 (str): ID du deuxième vecteur.
+
+    Avec le backend mmap, le score est calculé sur l'index du processus ; PostgreSQL n'est interrogé
+    que si l'un des documents n'y est pas.
     """
+    if config.EMBEDDING_SEARCH_BACKEND == "mmap":
+        from api.services.embedding_mmap import MemmapVectorIndex
+        try:
+            score = MemmapVectorIndex.get_instance().similarity(id1, id2)
+            if score is not None:
+                return score
+        except (OSError, ValueError) as e:
+            print(f"Index mmap inutilisable ({e}), score calculé dans PostgreSQL")
+    owned = conn is None
+    conn = conn or connect_to_db()
+    if conn is None:
+        return None
     try:
         query = """
         SELECT 1 - (vector <=> (SELECT vector FROM embedding e2 WHERE id = %s)) AS similarity
@@ -173,16 +314,19 @@ def get_similarity_score_between_vectors(conn, id1, id2):
     except Exception as e:
         print(f"Error getting similarity score: {e}")
         return None
+    finally:
+        if owned:
+            conn.close()
 
 def get_all_data_similar_documents(doc_list, mongo_url, collection_name, conn):
     """
     Récupère toutes les données des documents similaires à partir de la liste de documents fournie.
 
     Args:
-        doc_list (list): Liste de documents similaires.
+        doc_list (list[SimilarDocument]): Liste de documents similaires.
         mongo_url (str): URL de connexion à la base de données MongoDB.
         collection_name (str): Nom de la collection dans MongoDB.
-        conn (conn): Connection à la base de données PostgreSQL.
+        conn (conn): Connection à la base de données PostgreSQL (None avec le backend mmap).
 
     Returns:
         list[dict]: Liste de dictionnaires contenant les données des documents similaires.
@@ -192,8 +336,8 @@ def get_all_data_similar_documents(doc_list, mongo_url, collection_name, conn):
     thread_children_map = {}
 
     for doc in doc_list:
-        id = doc[0]
-        similarity_score = doc[2]
+        id = doc.id
+        similarity_score = doc.score
         data = get_data_for_thread(mongo_url, collection_name, id)
         if data:
             data["similarity_score"] = similarity_score
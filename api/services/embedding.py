@@ -1,19 +1,17 @@
 import json
 import os
-
-#Analyse sentiment
-from transformers import AutoTokenizer, AutoModelForSequenceClassification # type: ignore
-import torch
-import numpy as np
-
-#Embedding
-from sentence_transformers import SentenceTransformer
+import sys
+import time
+import argparse
+import threading
+from datetime import datetime, timezone
 
 #PostgreSQL
 import psycopg2
 
 #MongoDB
 from pymongo import MongoClient
+from pymongo.errors import OperationFailure
 
 #Environnement
 from dotenv import load_dotenv
@@ -21,32 +19,95 @@ from dotenv import load_dotenv
 #Barre de progression
 from tqdm import tqdm
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from api import config
+from api.services.embedding_store import (
+    EmbeddingWriter, hash_text, normalize_body, get_sync_position, set_sync_position, create_body_hash_column,
+    get_body_hashes, delete_embeddings, get_text_vectors, create_chunk_table, get_text_chunks,
+    create_course_columns, backfill_course_columns, get_ids_without_body_hash, set_body_hashes
+)
+from api.services.embedding_pipeline import run_embedding_pipeline
+from api.services.embedding_cache import QueryEmbeddingCache
+from api.services.embedding_pool import EncodingPool
+from api.services.mongo_helper import parse_mongo_date, modified_since_filter
+
 load_dotenv()
 
-model_multilingue = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
+# Modèle d'embedding, chargé au premier usage (voir get_embedding_model)
+_model = None
+_model_lock = threading.Lock()
+_model_load_time = None
 
 
+def get_embedding_model():
+    """
+    Retourne le modèle d'embedding partagé par le processus, chargé au premier appel (thread-safe).
+
+    sentence_transformers (et donc torch) n'est importé qu'ici : importer ce module ne charge ni le modèle ni torch.
+
+    Returns:
+        SentenceTransformer: Le modèle config.EMBEDDING_MODEL_NAME.
+    """
+    global _model, _model_load_time
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                start = time.time()
+                from sentence_transformers import SentenceTransformer
+                _model = SentenceTransformer(config.EMBEDDING_MODEL_NAME)
+                _model_load_time = time.time() - start
+                print(f"Modèle d'embedding {config.EMBEDDING_MODEL_NAME} chargé en {_model_load_time:.2f} secondes.")
+    return _model
+
+def embedding_model_stats():
+    """
+    Retourne l'état de chargement du modèle d'embedding.
+
+    Returns:
+        dict: Nom du modèle, état de chargement et temps de chargement.
+    """
+    return {
+        "model_name": config.EMBEDDING_MODEL_NAME,
+        "loaded": _model is not None,
+        "load_time": _model_load_time,
+    }
+
+def warmup():
+    """
+    Charge le modèle d'embedding et encode une première phrase, à appeler au démarrage de l'API
+    pour que la première requête ne paie pas le chargement.
+
+    Returns:
+        dict: Les informations de chargement du modèle.
+    """
+    get_embedding_model().encode("Bonjour")
+    return embedding_model_stats()
+
+
+def connexion_postgres():
+    """
+    Ouvre une connexion à PostgreSQL à partir des variables d'environnement DB_*.
+
+    Returns:
+        conn: Connexion à la base de données.
+    """
+    return psycopg2.connect(
+        host=os.getenv("DB_HOST"),
+        port=os.getenv("DB_PORT"),
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD"),
+        database=os.getenv("DB_NAME")
+    )
+
 def base_postgres(requete, params=None, fetch_results=False):
     # Étape 1: Connexion à PostgreSQL
-    # Récupération des variables d'environnement
-    DB_HOST = os.getenv("DB_HOST")
-    DB_PORT = os.getenv("DB_PORT")
-    DB_USER = os.getenv("DB_USER")
-    DB_PASSWORD = os.getenv("DB_PASSWORD")
-    DB_NAME = os.getenv("DB_NAME")
     conn = None
     cursor = None
     results = None
     
     try:
         # Connexion à la base de données par défaut
-        conn = psycopg2.connect(
-            host=DB_HOST,
-            port=DB_PORT,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            database=DB_NAME
-        )
+        conn = connexion_postgres()
         conn.autocommit = True
         cursor = conn.cursor()
         
@@ -77,6 +138,9 @@ def connexion_mongodb():
 def embedding_message(message):
     """
     Fonction pour créer un embedding à partir d'un message.
+
+    Les vecteurs sont gardés dans le cache des questions (voir QueryEmbeddingCache) :
+    une question déjà posée, à la casse et aux espaces près, ne repasse pas par le modèle.
     
     Args:
         message (str): Le message à encoder.
@@ -84,39 +148,244 @@ def embedding_message(message):
     Returns:
         list: Le vecteur d'embedding du message.
     """
-    if not message:
+    if not message or not message.strip():
         return None
+
+    cache = QueryEmbeddingCache.get_instance()
+    embedding_list = cache.get(message, config.EMBEDDING_MODEL_NAME)
+    if embedding_list is not None:
+        return embedding_list
     
     # Créer l'embedding
-    embedding_vector = model_multilingue.encode(message)
+    embedding_vector = get_embedding_model().encode(message)
     
     # Convertir le vecteur numpy en liste Python
     embedding_list = embedding_vector.tolist()
+    cache.put(message, config.EMBEDDING_MODEL_NAME, embedding_list)
     
     return embedding_list
 
-def add_embedding():
+def encode_messages(messages, batch_size=None):
+    """
+    Encode plusieurs messages en un seul appel au modèle, qui les traite par lots.
+
+    Args:
+        messages (list[str]): Les messages à encoder.
+        batch_size (int, optional): Taille des lots passés au modèle. Defaults to config.EMBEDDING_BATCH_SIZE.
+
+    Returns:
+        list[list[float]]: Un vecteur d'embedding par message, dans le même ordre.
+    """
+    if not messages:
+        return []
+    batch_size = batch_size or config.EMBEDDING_BATCH_SIZE
+    return get_embedding_model().encode(messages, batch_size=batch_size).tolist()
+
+def split_chunks(text, overlap=None):
+    """
+    Découpe un message trop long pour le modèle en fenêtres de tokens qui se chevauchent.
+
+    Les fenêtres sont des extraits du texte d'origine (grâce aux positions des tokens), sans passer par un décodage.
+
+    Args:
+        text (str): Contenu du message.
+        overlap (int, optional): Nombre de tokens communs à deux fenêtres consécutives. Defaults to config.EMBEDDING_CHUNK_OVERLAP.
+
+    Returns:
+        list[str]: Les fenêtres, ou une liste vide si le message tient dans une seule séquence.
+    """
+    model = get_embedding_model()
+    tokenizer = model.tokenizer
+    taille_fenetre = model.max_seq_length - tokenizer.num_special_tokens_to_add()
+    overlap = config.EMBEDDING_CHUNK_OVERLAP if overlap is None else overlap
+    offsets = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True, verbose=False)["offset_mapping"]
+    if len(offsets) <= taille_fenetre:
+        return []
+    pas = max(1, taille_fenetre - overlap)
+    chunks = []
+    for debut in range(0, len(offsets), pas):
+        fin = min(debut + taille_fenetre, len(offsets))
+        chunks.append(text[offsets[debut][0]:offsets[fin - 1][1]])
+        if fin == len(offsets):
+            break
+    return chunks
+
+def embed_bodies(docs, known_vectors, batch_size=None, known_chunks=None, encode=None, split=None):
+    """
+    Calcule le vecteur de chaque document en n'encodant qu'une fois chaque contenu normalisé distinct.
+
+    Si config.EMBEDDING_CHUNKING est activé, les contenus trop longs pour le modèle reçoivent aussi
+    un vecteur par fenêtre (voir split_chunks), partagé entre les documents de même contenu.
+
+    Args:
+        docs (list[tuple]): Tuples (id, contenu, thread_id).
+        known_vectors (dict): {empreinte: vecteur} déjà présents dans la table embedding, qui ne sont pas ré-encodés.
+        batch_size (int, optional): Taille des lots passés au modèle. Defaults to config.EMBEDDING_BATCH_SIZE.
+        known_chunks (dict, optional): {empreinte: [vecteurs]} des fenêtres déjà calculées. Defaults to None.
+        encode (callable, optional): Fonction d'encodage (messages, batch_size), par exemple EncodingPool.encode. Defaults to encode_messages.
+        split (callable, optional): Découpage d'une liste de contenus en fenêtres, par exemple EncodingPool.split.
+            Defaults to split_chunks appliqué dans ce processus.
+
+    Returns:
+        tuple: (lignes (id, vecteur, empreinte, thread_id) pour chaque document, couples (empreinte, vecteur) nouvellement encodés,
+            fenêtres (id, numéro, vecteur) ou None si le découpage est désactivé).
+    """
+    doc_hashes = []
+    distinct = {}
+    for id, body, thread_id in docs:
+        body_hash = hash_text(body)
+        doc_hashes.append((id, body_hash, thread_id))
+        if body_hash not in distinct:
+            distinct[body_hash] = normalize_body(body)
+    to_encode = {body_hash: text for body_hash, text in distinct.items() if body_hash not in known_vectors}
+    encode = encode or encode_messages
+    texts = list(zip(to_encode, encode(list(to_encode.values()), batch_size=batch_size)))
+    vectors = {**known_vectors, **dict(texts)}
+    rows = [(id, vectors[body_hash], body_hash, thread_id) for id, body_hash, thread_id in doc_hashes]
+    if not config.EMBEDDING_CHUNKING:
+        return rows, texts, None
+
+    chunk_vectors = dict(known_chunks or {})
+    to_split = {body_hash: text for body_hash, text in distinct.items() if body_hash not in chunk_vectors}
+    split = split or (lambda texts: [split_chunks(text) for text in texts])
+    windows = dict(zip(to_split, split(list(to_split.values()))))
+    windows = {body_hash: chunks for body_hash, chunks in windows.items() if chunks}
+    # Encoder toutes les fenêtres du lot en un seul appel
+    encoded = iter(encode([chunk for chunks in windows.values() for chunk in chunks], batch_size=batch_size))
+    for body_hash, chunks in windows.items():
+        chunk_vectors[body_hash] = [next(encoded) for _ in chunks]
+    chunks = [(id, numero, vector) for id, body_hash, _ in doc_hashes for numero, vector in enumerate(chunk_vectors.get(body_hash, []))]
+    return rows, texts, chunks
+
+def load_existing_ids(conn):
+    """
+    Récupère les IDs des documents qui ont déjà un embedding.
+
+    Args:
+        conn: Connexion à la base de données.
+
+    Returns:
+        set: IDs présents dans la table embedding.
+    """
+    with conn.cursor() as cur:
+        cur.execute("SELECT id FROM embedding")
+        return {row[0] for row in cur.fetchall()}
+
+BACKFILL_STATE = "backfill"
+SYNC_UPDATED_AT_STATE = "sync_updated_at"
+SYNC_CHANGE_STREAM_STATE = "sync_change_stream"
+
+def iter_documents_to_embed(client, existing_ids, batch_size, after_id=None):
+    """
+    Parcourt G1.documents par ordre de _id, à partir d'une position, et renvoie par lots les documents sans embedding.
+
+    Chaque document n'est lu qu'une fois : la reprise se fait par une requête d'intervalle sur _id
+    (servie par l'index de _id) et non en relisant ou en sautant les documents déjà vus.
+
+    Args:
+        client (MongoClient): Client MongoDB.
+        existing_ids (set): IDs déjà présents dans la table embedding.
+        batch_size (int): Nombre de documents par lot.
+        after_id (str, optional): Ne lire que les documents dont le _id est supérieur. Defaults to None.
+
+    Yields:
+        tuple: (lot de documents à encoder, dernier _id lu pour ce lot).
+    """
+    filter = {"_id": {"$gt": after_id}} if after_id is not None else {}
+    cursor = client['G1']['documents'].find(filter, {"id": 1, "body": 1, "thread_id": 1}).sort("_id", 1).batch_size(batch_size)
+    batch_docs = []
+    last_id = None
+    for doc in cursor:
+        last_id = doc["_id"]
+        if doc.get("id", "") not in existing_ids:
+            batch_docs.append(doc)
+            if len(batch_docs) >= batch_size:
+                yield batch_docs, last_id
+                batch_docs = []
+    if batch_docs or last_id is not None:
+        yield batch_docs, last_id
+
+def seed_body_hashes(client, conn, batch_size=1000):
+    """
+    Renseigne body_hash des embeddings calculés avant son ajout, à partir du contenu actuel dans MongoDB.
+
+    Sans empreinte, la première synchronisation considérerait tous ces documents comme modifiés
+    et les ré-encoderait tous ; le vecteur existant est supposé correspondre au contenu actuel.
+
+    Args:
+        client (MongoClient): Client MongoDB.
+        conn: Connexion à la base de données.
+        batch_size (int, optional): Nombre de documents lus par requête. Defaults to 1000.
+
+    Returns:
+        int: Nombre d'empreintes renseignées.
+    """
+    ids = get_ids_without_body_hash(conn)
+    seeded = 0
+    for start in range(0, len(ids), batch_size):
+        batch = ids[start:start + batch_size]
+        docs = client['G1']['documents'].find({"id": {"$in": batch}}, {"id": 1, "body": 1})
+        hashes = [(doc["id"], hash_text(doc["body"])) for doc in docs if doc.get("body")]
+        set_body_hashes(conn, hashes)
+        seeded += len(hashes)
+    return seeded
+
+def add_embedding(batch_size=1000, encode_batch_size=None, write_method="copy", queue_size=4, encode_workers=1, connect=None, restart=False,
+                  processes=None, torch_threads=None):
+    """
+    Calcule et enregistre l'embedding des documents de G1.documents qui n'en ont pas encore.
+
+    La lecture MongoDB, l'encodage et l'écriture PostgreSQL tournent en parallèle
+    (voir run_embedding_pipeline) ; les temps de chaque étape sont affichés à la fin.
+    Le dernier _id entièrement enregistré est conservé dans embedding_sync_state :
+    un nouvel appel reprend juste après, sans relire les documents déjà traités.
+    Les contenus identiques (à la normalisation près) ne sont encodés qu'une fois, et le vecteur
+    d'un contenu déjà présent dans la table embedding est réutilisé sans passer par le modèle.
+    Le backfill prépare aussi la synchronisation incrémentale : empreinte du contenu des embeddings
+    existants (voir seed_body_hashes) et position de départ de la synchronisation par updated_at.
+
+    Args:
+        batch_size (int, optional): Nombre de documents lus, encodés et écrits ensemble. Defaults to 1000.
+        encode_batch_size (int, optional): Taille des lots passés au modèle. Defaults to config.EMBEDDING_BATCH_SIZE.
+        write_method (str, optional): "copy" ou "values", voir EmbeddingWriter. Defaults to "copy".
+        queue_size (int, optional): Nombre maximal de lots en attente entre deux étapes. Defaults to 4.
+        encode_workers (int, optional): Nombre de threads d'encodage. Defaults to 1.
+        connect (callable, optional): Fonction qui ouvre la connexion PostgreSQL. Defaults to connexion_postgres.
+        restart (bool, optional): Ignorer la position enregistrée et relire toute la collection. Defaults to False.
+        processes (int, optional): Nombre de processus d'encodage (voir EncodingPool), 1 pour encoder dans ce processus.
+            Defaults to config.EMBEDDING_PROCESSES.
+        torch_threads (int, optional): Threads torch par processus d'encodage. Defaults to config.EMBEDDING_TORCH_THREADS
+            (ou nombre de cœurs / processes).
+    """
     client = connexion_mongodb()
-    # Utiliser une taille de lot appropriée
-    batch_size = 1000
+    conn = (connect or connexion_postgres)()
+    create_body_hash_column(conn)
+    create_course_columns(conn)
+    if config.EMBEDDING_CHUNKING:
+        create_chunk_table(conn)
+    # Point de départ de la synchronisation par updated_at : les documents modifiés après le début du backfill
+    if get_sync_position(conn, SYNC_UPDATED_AT_STATE) is None:
+        set_sync_position(conn, SYNC_UPDATED_AT_STATE, datetime.now(timezone.utc).isoformat())
+    seeded = seed_body_hashes(client, conn, batch_size=batch_size)
+    if seeded:
+        print(f"{seeded} empreintes de contenu renseignées pour les embeddings existants")
+    watermark = None if restart else get_sync_position(conn, BACKFILL_STATE)
+    if watermark is not None:
+        print(f"Reprise après le document {watermark}")
     
     # Récupérer tous les IDs déjà traités dans PostgreSQL
-    existing_ids = set()
-    requete = "SELECT id FROM embedding"
     try:
-        # Utiliser notre fonction base_postgres modifiée pour récupérer les IDs existants
-        rows = base_postgres(requete, fetch_results=True)
-        if rows:
-            for row in rows:
-                existing_ids.add(row[0])
+        existing_ids = load_existing_ids(conn)
         print(f"{len(existing_ids)} embeddings déjà traités trouvés dans la base de données")
     except Exception as e:
+        conn.rollback()
+        existing_ids = set()
         print(f"Erreur lors de la récupération des IDs existants: {e}")
     
-    # Récupérer le nombre total de documents
-    total_docs = client['G1']['documents'].count_documents({})
+    # Récupérer le nombre de documents après la position enregistrée
+    total_docs = client['G1']['documents'].count_documents({"_id": {"$gt": watermark}} if watermark is not None else {})
     # Calculer le nombre de documents restants à traiter
-    remaining_docs = total_docs - len(existing_ids)
+    remaining_docs = total_docs if watermark is not None else total_docs - len(existing_ids)
     
     print(f"Total des documents: {total_docs}")
     print(f"Documents restants à traiter: {remaining_docs}")
@@ -124,64 +393,265 @@ def add_embedding():
     # Si tous les documents sont déjà traités, terminer
     if remaining_docs <= 0:
         print("Tous les documents ont déjà été traités. Rien à faire.")
+        conn.close()
         return
     
-    # Créer un filtre pour exclure les documents déjà traités
-    # Note: Cette approche fonctionne mieux si le nombre d'IDs existants n'est pas trop grand
     processed = 0
-    filtered_docs = 0
-    
-    # Traiter les documents par lots en excluant ceux déjà traités
+    start = time.time()
+    writer = EmbeddingWriter(conn, method=write_method, page_size=batch_size)
+    # Lots écrits mais pas encore couverts par la position enregistrée (les workers peuvent finir dans le désordre)
+    written = {}
+    next_seq = 0
+    encoded_texts = 0
+
+    # Connexion dédiée à la lecture des vecteurs connus, la principale étant utilisée par l'écriture
+    lookup_conn = (connect or connexion_postgres)()
+
+    def read():
+        for seq, (batch_docs, last_id) in enumerate(iter_documents_to_embed(client, existing_ids, batch_size, after_id=watermark)):
+            # Les messages vides sont ignorés
+            docs = [(doc.get("id", ""), doc["body"], doc.get("thread_id")) for doc in batch_docs if doc.get("body", "")]
+            hashes = {hash_text(body) for _, body, _ in docs}
+            known_vectors = get_text_vectors(lookup_conn, hashes)
+            known_chunks = get_text_chunks(lookup_conn, hashes) if config.EMBEDDING_CHUNKING else None
+            lookup_conn.commit()
+            yield seq, docs, known_vectors, known_chunks, len(batch_docs), last_id
+
+    def encode(item):
+        seq, docs, known_vectors, known_chunks, nb_docs, last_id = item
+        # Encoder en un seul appel les contenus distincts du lot qui n'ont pas encore de vecteur
+        rows, texts, chunks = embed_bodies(docs, known_vectors, batch_size=encode_batch_size, known_chunks=known_chunks,
+                                           encode=pool.encode if pool else None, split=pool.split if pool else None)
+        return seq, rows, texts, chunks, nb_docs, last_id
+
     with tqdm(total=remaining_docs, desc="Traitement des documents restants") as pbar:
-        # Pour chaque lot de documents
-        while processed < remaining_docs:
-            # Récupérer un lot de documents non traités
-            cursor = client['G1']['documents'].find()
-            batch_count = 0
+        def write(result):
+            nonlocal processed, next_seq, encoded_texts
+            seq, rows, texts, chunks, nb_docs, last_id = result
+            writer.write(rows, chunks)
+            encoded_texts += len(texts)
+            # Avancer la position jusqu'au dernier lot écrit sans trou avant lui
+            written[seq] = last_id
+            position = None
+            while next_seq in written:
+                position = written.pop(next_seq)
+                next_seq += 1
+            if position is not None:
+                set_sync_position(conn, BACKFILL_STATE, position)
+            processed += nb_docs
+            pbar.update(nb_docs)
+            pbar.set_postfix(docs_s=f"{processed / (time.time() - start):.1f}")
+
+        processes = processes or config.EMBEDDING_PROCESSES
+        pool = EncodingPool(processes, torch_threads or config.EMBEDDING_TORCH_THREADS) if processes > 1 else None
+        if pool:
+            # Un thread d'encodage par processus, pour que chaque processus ait toujours un lot à encoder
+            print(f"Encodage sur {processes} processus de {pool.torch_threads} threads torch")
+            encode_workers = max(encode_workers, processes)
+            queue_size = max(queue_size, processes)
+        try:
+            report = run_embedding_pipeline(
+                read,
+                encode,
+                write,
+                queue_size=queue_size,
+                encode_workers=encode_workers
+            )
+        finally:
+            lookup_conn.close()
+            if pool:
+                pool.close()
+    
+    conn.close()
+    elapsed = time.time() - start
+    print(f"Traitement terminé: {processed} nouveaux documents traités en {elapsed:.1f} secondes ({processed / elapsed if elapsed else 0:.1f} docs/s)")
+    print(f"Étapes du pipeline: {report}")
+    print(f"Contenus distincts encodés: {encoded_texts} pour {writer.rows_written} documents")
+    print(f"Écriture PostgreSQL: {writer.stats()}")
+
+def sync_documents(conn, writer, docs):
+    """
+    Ré-encode les documents dont le contenu a changé depuis leur dernier embedding et met à jour leurs vecteurs.
+
+    Un contenu déjà présent dans la table embedding réutilise son vecteur sans passer par le modèle.
+
+    Args:
+        conn: Connexion à la base de données.
+        writer (EmbeddingWriter): Writer en mode upsert.
+        docs (list[dict]): Documents insérés ou modifiés (id, body, thread_id).
+
+    Returns:
+        int: Nombre de documents ré-encodés.
+    """
+    # Garder la dernière version de chaque document du lot
+    latest = {}
+    for doc in docs:
+        if doc.get("id") and doc.get("body"):
+            latest[doc["id"]] = (doc["body"], doc.get("thread_id"))
+    stored = get_body_hashes(conn, list(latest))
+    changed = [(id, body, thread_id) for id, (body, thread_id) in latest.items() if stored.get(id) != hash_text(body)]
+    if not changed:
+        return 0
+    hashes = {hash_text(body) for _, body, _ in changed}
+    known_vectors = get_text_vectors(conn, hashes)
+    known_chunks = get_text_chunks(conn, hashes) if config.EMBEDDING_CHUNKING else None
+    rows, _, chunks = embed_bodies(changed, known_vectors, known_chunks=known_chunks)
+    writer.write(rows, chunks)
+    return len(changed)
+
+def sync_by_updated_at(client, conn, writer, batch_size=1000):
+    """
+    Synchronise les documents créés ou modifiés depuis le dernier passage, repéré par updated_at/created_at.
+
+    La position enregistrée est la date la plus récente vue, en ISO 8601 UTC (ex: "2024-01-01T12:00:00+00:00") ;
+    les dates des documents peuvent être des dates BSON ou des chaînes ISO 8601 UTC (voir modified_since_filter).
+    La comparaison est inclusive pour ne pas perdre les documents modifiés à la même date, qui ne sont
+    de toute façon pas ré-encodés si leur contenu n'a pas changé.
+
+    Args:
+        client (MongoClient): Client MongoDB.
+        conn: Connexion à la base de données.
+        writer (EmbeddingWriter): Writer en mode upsert.
+        batch_size (int, optional): Nombre de documents par lot. Defaults to 1000.
+
+    Returns:
+        int: Nombre de documents ré-encodés.
+    """
+    since = parse_mongo_date(get_sync_position(conn, SYNC_UPDATED_AT_STATE))
+    filter = modified_since_filter(since) if since else {}
+    cursor = client['G1']['documents'].find(filter, {"id": 1, "body": 1, "thread_id": 1, "updated_at": 1, "created_at": 1}).batch_size(batch_size)
+
+    position = since
+    encoded = 0
+    batch_docs = []
+    for doc in cursor:
+        batch_docs.append(doc)
+        dates = [date for date in (parse_mongo_date(doc.get("updated_at")), parse_mongo_date(doc.get("created_at"))) if date]
+        if dates and (position is None or max(dates) > position):
+            position = max(dates)
+        if len(batch_docs) >= batch_size:
+            encoded += sync_documents(conn, writer, batch_docs)
             batch_docs = []
-            
-            for doc in cursor:
-                doc_id = doc.get("id", "")
-                if doc_id not in existing_ids:
-                    batch_docs.append(doc)
-                    batch_count += 1
-                    filtered_docs += 1
-                
-                # Si nous avons assez de documents pour ce lot ou si nous avons parcouru tous les docs
-                if batch_count >= batch_size or filtered_docs >= total_docs:
+    encoded += sync_documents(conn, writer, batch_docs)
+    # La position n'est enregistrée qu'une fois tout le passage écrit : le curseur n'est pas trié par date
+    if position != since:
+        set_sync_position(conn, SYNC_UPDATED_AT_STATE, position.isoformat())
+    return encoded
+
+def sync_by_change_stream(client, conn, writer, batch_size=1000, max_wait=5.0, follow=False):
+    """
+    Synchronise les documents à partir du change stream de G1.documents (nécessite un replica set).
+
+    Les changements sont regroupés par lots ; le jeton de reprise est enregistré après chaque lot écrit.
+    Au tout premier passage, l'écoute commence au moment de l'appel : lancer le backfill au préalable.
+
+    Args:
+        client (MongoClient): Client MongoDB.
+        conn: Connexion à la base de données.
+        writer (EmbeddingWriter): Writer en mode upsert.
+        batch_size (int, optional): Nombre maximal de changements par lot. Defaults to 1000.
+        max_wait (float, optional): Délai en secondes avant d'écrire un lot incomplet. Defaults to 5.0.
+        follow (bool, optional): Continuer à écouter au lieu de s'arrêter dès qu'il n'y a plus de changement. Defaults to False.
+
+    Returns:
+        int: Nombre de documents ré-encodés.
+
+    Raises:
+        OperationFailure: Si le serveur MongoDB ne permet pas les change streams.
+    """
+    token = get_sync_position(conn, SYNC_CHANGE_STREAM_STATE)
+    pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace", "delete"]}}}]
+    encoded = 0
+    with client['G1']['documents'].watch(
+        pipeline,
+        full_document="updateLookup",
+        resume_after=json.loads(token) if token else None,
+        max_await_time_ms=int(max_wait * 1000)
+    ) as stream:
+        while True:
+            upserts, deletes = [], []
+            start = time.time()
+            while len(upserts) + len(deletes) < batch_size and time.time() - start < max_wait:
+                change = stream.try_next()
+                if change is None:
                     break
-            
-            if not batch_docs:
-                break
-                
-            # Traiter ce lot de documents
-            for doc in batch_docs:
-                doc_id = doc.get("id", "")
-                message = doc.get("body", "")
-                
-                if message == "":
-                    pbar.update(1)
-                    processed += 1
-                    continue
-                    
-                embedding_vector = model_multilingue.encode(message)
-                # Convertir le vecteur numpy en liste Python
-                embedding_list = embedding_vector.tolist()
-                # Préparer la requête avec des paramètres
-                requete = "INSERT INTO embedding (id, vector) VALUES (%s, %s::vector) ON CONFLICT (id) DO NOTHING"
-                base_postgres(requete, (doc_id, str(embedding_list)))
-                
-                # Ajouter l'ID à l'ensemble des IDs déjà traités
-                existing_ids.add(doc_id)
-                
-                pbar.update(1)
-                processed += 1
-            
-            # Si nous avons parcouru tous les documents, terminer
-            if filtered_docs >= total_docs:
-                break
-        
-        print(f"Traitement terminé: {processed} nouveaux documents traités")
+                if change["operationType"] == "delete":
+                    deletes.append(change["documentKey"]["_id"])
+                elif change.get("fullDocument"):
+                    upserts.append(change["fullDocument"])
+            if upserts or deletes:
+                encoded += sync_documents(conn, writer, upserts)
+                delete_embeddings(conn, deletes)
+            if stream.resume_token is not None:
+                set_sync_position(conn, SYNC_CHANGE_STREAM_STATE, json.dumps(stream.resume_token))
+            if not upserts and not deletes and not follow:
+                return encoded
+
+def sync_embeddings(mode="auto", batch_size=1000, write_method="copy", follow=False, connect=None):
+    """
+    Met à jour les embeddings des documents insérés ou modifiés depuis la dernière synchronisation.
+
+    Seuls les documents dont l'empreinte du contenu a changé sont ré-encodés, et leur vecteur est remplacé :
+    le coût est proportionnel au nombre de changements et non à la taille du corpus.
+
+    Args:
+        mode (str, optional): "change_stream", "updated_at" ou "auto" (change stream si le serveur le permet). Defaults to "auto".
+        batch_size (int, optional): Nombre de documents par lot. Defaults to 1000.
+        write_method (str, optional): "copy" ou "values", voir EmbeddingWriter. Defaults to "copy".
+        follow (bool, optional): En mode change stream, continuer à écouter les changements. Defaults to False.
+        connect (callable, optional): Fonction qui ouvre la connexion PostgreSQL. Defaults to connexion_postgres.
+
+    Returns:
+        int: Nombre de documents ré-encodés.
+    """
+    client = connexion_mongodb()
+    conn = (connect or connexion_postgres)()
+    create_body_hash_column(conn)
+    create_course_columns(conn)
+    if config.EMBEDDING_CHUNKING:
+        create_chunk_table(conn)
+    writer = EmbeddingWriter(conn, method=write_method, page_size=batch_size, upsert=True)
+    start = time.time()
+    try:
+        if mode in ("auto", "change_stream"):
+            try:
+                encoded = sync_by_change_stream(client, conn, writer, batch_size=batch_size, follow=follow)
+            except OperationFailure as e:
+                if mode == "change_stream":
+                    raise
+                # Serveur autonome (sans replica set) : pas de change stream
+                print(f"Change streams indisponibles ({e}), synchronisation par updated_at")
+                conn.rollback()
+                encoded = sync_by_updated_at(client, conn, writer, batch_size=batch_size)
+        else:
+            encoded = sync_by_updated_at(client, conn, writer, batch_size=batch_size)
+    finally:
+        conn.close()
+    print(f"Synchronisation terminée: {encoded} documents ré-encodés en {time.time() - start:.1f} secondes")
+    print(f"Écriture PostgreSQL: {writer.stats()}")
+    return encoded
 
 if __name__ == "__main__":
-    add_embedding()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Calcule ou met à jour les embeddings de G1.documents.")
+    parser.add_argument("command", nargs="?", choices=["backfill", "sync", "migrate"], default="backfill")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Nombre de documents par lot")
+    parser.add_argument("--mode", choices=["auto", "change_stream", "updated_at"], default="auto", help="Source des changements pour sync")
+    parser.add_argument("--follow", action="store_true", help="sync : continuer à écouter le change stream")
+    parser.add_argument("--restart", action="store_true", help="backfill : ignorer la position enregistrée")
+    parser.add_argument("--processes", type=int, default=None, help="backfill : nombre de processus d'encodage")
+    parser.add_argument("--torch-threads", type=int, default=None, help="backfill : threads torch par processus d'encodage")
+    args = parser.parse_args()
+    if args.command == "migrate":
+        # Ajouter les colonnes body_hash / thread_id / course_id / course_name, puis renseigner
+        # le cours des embeddings calculés avant leur ajout
+        conn = connexion_postgres()
+        try:
+            create_body_hash_column(conn)
+            create_course_columns(conn)
+            print(f"{backfill_course_columns(conn, batch_size=args.batch_size)} embeddings mis à jour")
+        finally:
+            conn.close()
+    elif args.command == "sync":
+        sync_embeddings(mode=args.mode, batch_size=args.batch_size, follow=args.follow)
+    else:
+        add_embedding(batch_size=args.batch_size, restart=args.restart, processes=args.processes, torch_threads=args.torch_threads)
\ No newline at end of file
@@ -0,0 +1,166 @@
+import os
+import sys
+import time
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+import numpy as np
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from api import config
+
+
+def normalize_query(text):
+    """
+    Normalise une question pour que les variantes de casse, d'accents composés et d'espaces partagent la même entrée.
+
+    Args:
+        text (str): Question de l'utilisateur.
+
+    Returns:
+        str: Question normalisée.
+    """
+    return " ".join(unicodedata.normalize("NFC", text).lower().split())
+
+
+class QueryEmbeddingCache:
+    """
+    Cache LRU des vecteurs de questions, avec expiration et stockage SQLite optionnel partagé entre workers.
+
+    Les entrées sont indexées par (nom du modèle, question normalisée) : changer de modèle n'utilise jamais un ancien vecteur.
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, max_size=1024, ttl=86400, path=None):
+        """
+        Args:
+            max_size (int, optional): Nombre maximal de vecteurs gardés en mémoire. Defaults to 1024.
+            ttl (float, optional): Durée de vie d'une entrée en secondes, 0 pour ne jamais expirer. Defaults to 86400.
+            path (str, optional): Fichier SQLite partagé, None pour un cache uniquement en mémoire. Defaults to None.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.path = path or None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if self.path:
+            with self._connect() as db:
+                db.execute("PRAGMA journal_mode=WAL")
+                db.execute("""
+                    CREATE TABLE IF NOT EXISTS query_embedding (
+                        model_name TEXT NOT NULL,
+                        query TEXT NOT NULL,
+                        vector BLOB NOT NULL,
+                        created_at REAL NOT NULL,
+                        PRIMARY KEY (model_name, query)
+                    )
+                    """)
+
+    @classmethod
+    def get_instance(cls):
+        """Retourne le cache du processus, configuré par config.EMBEDDING_CACHE_*."""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = QueryEmbeddingCache(config.EMBEDDING_CACHE_SIZE, config.EMBEDDING_CACHE_TTL, config.EMBEDDING_CACHE_PATH)
+            return cls._instance
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5)
+
+    def _expired(self, created_at):
+        return self.ttl > 0 and time.time() - created_at > self.ttl
+
+    def _remember(self, key, vector, created_at):
+        self._entries[key] = (vector, created_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, text, model_name):
+        """
+        Cherche le vecteur d'une question, en mémoire puis dans le stockage SQLite.
+
+        Args:
+            text (str): Question de l'utilisateur.
+            model_name (str): Nom du modèle d'embedding.
+
+        Returns:
+            list[float] | None: Le vecteur, ou None s'il n'est pas en cache.
+        """
+        key = (model_name, normalize_query(text))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and not self._expired(entry[1]):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+
+        if self.path:
+            try:
+                with self._connect() as db:
+                    row = db.execute("SELECT vector, created_at FROM query_embedding WHERE model_name = ? AND query = ?", key).fetchone()
+            except sqlite3.Error as e:
+                print(f"Error reading query embedding cache: {e}")
+                row = None
+            if row is not None and not self._expired(row[1]):
+                vector = np.frombuffer(row[0], dtype=np.float32).tolist()
+                with self._lock:
+                    self._remember(key, vector, row[1])
+                    self.disk_hits += 1
+                return vector
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, text, model_name, vector):
+        """
+        Enregistre le vecteur d'une question.
+
+        Args:
+            text (str): Question de l'utilisateur.
+            model_name (str): Nom du modèle d'embedding.
+            vector (list[float]): Vecteur de la question.
+        """
+        key = (model_name, normalize_query(text))
+        created_at = time.time()
+        with self._lock:
+            self._remember(key, vector, created_at)
+        if self.path:
+            try:
+                with self._connect() as db:
+                    db.execute(
+                        "INSERT OR REPLACE INTO query_embedding (model_name, query, vector, created_at) VALUES (?, ?, ?, ?)",
+                        (*key, np.asarray(vector, dtype=np.float32).tobytes(), created_at)
+                    )
+            except sqlite3.Error as e:
+                print(f"Error writing query embedding cache: {e}")
+
+    def stats(self):
+        """
+        Retourne la taille du cache et ses compteurs.
+
+        Returns:
+            dict: Entrées en mémoire, succès (mémoire et disque), échecs, évictions et taux de succès.
+        """
+        with self._lock:
+            total = self.hits + self.disk_hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "disk_store": self.path,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits + self.disk_hits) / total if total else None,
+            }
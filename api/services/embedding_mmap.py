@@ -0,0 +1,220 @@
+import os
+import sys
+import json
+import time
+import bisect
+import threading
+import numpy as np
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from api import config
+from api.services.similarity import SimilarDocument, parse_vector_send
+
+# Lignes multipliées par la question en une fois (borne la mémoire temporaire d'un index float16)
+SEARCH_BLOCK_SIZE = 65536
+
+
+def export_vector_index(conn, path=None, dtype="float32", batch_size=10000):
+    """
+    Exporte les vecteurs de la table embedding dans un fichier .npy contigu, lisible par memory-map.
+
+    Les vecteurs sont normalisés (la similarité cosinus devient un produit scalaire) et triés par cours :
+    chaque cours occupe une plage de lignes contiguë. Les ids, threads et plages de cours sont écrits
+    dans un fichier JSON à côté. Les deux fichiers sont remplacés en fin d'export, les processus qui
+    lisent l'ancien index le gardent jusqu'à leur rechargement.
+
+    Args:
+        conn: Connexion à la base de données.
+        path (str, optional): Chemin des fichiers, sans extension. Defaults to config.EMBEDDING_MMAP_PATH.
+        dtype (str, optional): "float32" ou "float16" (deux fois plus petit). Defaults to "float32".
+        batch_size (int, optional): Lignes lues par aller-retour avec PostgreSQL. Defaults to 10000.
+
+    Returns:
+        dict: Métadonnées de l'index exporté (nombre de vecteurs, dimension, type, cours).
+    """
+    path = path or config.EMBEDDING_MMAP_PATH
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn.rollback()
+    with conn.cursor() as cur:
+        # Même instantané pour le comptage et la lecture
+        cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+        cur.execute("SELECT count(*), max(vector_dims(vector)) FROM embedding")
+        count, dim = cur.fetchone()
+    if not count:
+        conn.rollback()
+        raise ValueError("La table embedding est vide : rien à exporter")
+
+    matrix = np.lib.format.open_memmap(path + ".tmp.npy", mode="w+", dtype=np.dtype(dtype), shape=(count, dim))
+    ids = []
+    thread_ids = []
+    courses = []
+    with conn.cursor(name="export_vector_index") as cur:
+        cur.itersize = batch_size
+        cur.execute("""
+            SELECT id, vector_send(vector), COALESCE(thread_id, id), course_name
+            FROM embedding
+            ORDER BY course_name NULLS LAST, id
+            """)
+        for row, (id, vector, thread_id, course_name) in enumerate(cur):
+            vector = parse_vector_send(vector)
+            norm = np.linalg.norm(vector)
+            matrix[row] = vector / norm if norm else vector
+            ids.append(id)
+            thread_ids.append(thread_id)
+            if course_name is not None:
+                if courses and courses[-1][0] == course_name:
+                    courses[-1][2] = row + 1
+                else:
+                    courses.append([course_name, row, row + 1])
+    conn.rollback()
+    matrix.flush()
+    del matrix
+
+    metadata = {
+        "count": count,
+        "dim": dim,
+        "dtype": dtype,
+        "exported_at": time.time(),
+        "courses": courses,
+        "ids": ids,
+        "thread_ids": thread_ids,
+    }
+    with open(path + ".tmp.json", "w", encoding="utf-8") as f:
+        json.dump(metadata, f)
+    os.replace(path + ".tmp.npy", path + ".npy")
+    os.replace(path + ".tmp.json", path + ".json")
+    return {"count": count, "dim": dim, "dtype": dtype, "courses": len(courses)}
+
+
+class MemmapVectorIndex:
+    """
+    Recherche des plus proches voisins dans l'index exporté par export_vector_index, sans aller-retour PostgreSQL.
+
+    La matrice est ouverte en memory-map en lecture seule : les workers uvicorn d'une même machine
+    partagent ses pages par le cache du système. L'index est rechargé quand un nouvel export remplace le fichier.
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): Chemin des fichiers de l'index, sans extension.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._index = None
+        self._mtime = None
+
+    @classmethod
+    def get_instance(cls):
+        """Retourne l'index du processus, ouvert depuis config.EMBEDDING_MMAP_PATH."""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = MemmapVectorIndex(config.EMBEDDING_MMAP_PATH)
+            return cls._instance
+
+    def _load(self):
+        """Ouvre l'index, ou le rouvre si les fichiers ont été remplacés depuis le dernier chargement."""
+        mtime = os.stat(self.path + ".json").st_mtime
+        if self._index is not None and mtime == self._mtime:
+            return self._index
+        with self._lock:
+            if self._index is not None and mtime == self._mtime:
+                return self._index
+            with open(self.path + ".json", encoding="utf-8") as f:
+                metadata = json.load(f)
+            matrix = np.load(self.path + ".npy", mmap_mode="r")
+            if matrix.shape != (metadata["count"], metadata["dim"]):
+                # Export en cours de remplacement : garder l'index déjà ouvert
+                if self._index is not None:
+                    return self._index
+                raise ValueError(f"Index {self.path} incohérent : {matrix.shape} pour {metadata['count']} ids")
+            self._index = {
+                "matrix": matrix,
+                "ids": metadata["ids"],
+                "thread_ids": metadata["thread_ids"],
+                "positions": {id: row for row, id in enumerate(metadata["ids"])},
+                "courses": {name: (start, end) for name, start, end in metadata["courses"]},
+                "course_starts": [start for _, start, _ in metadata["courses"]],
+                "course_names": [name for name, _, _ in metadata["courses"]],
+                "course_ends": [end for _, _, end in metadata["courses"]],
+            }
+            self._mtime = mtime
+            return self._index
+
+    def _course_of(self, index, row):
+        position = bisect.bisect_right(index["course_starts"], row) - 1
+        if position >= 0 and row < index["course_ends"][position]:
+            return index["course_names"][position]
+        return None
+
+    def search(self, vector, limit=5, course_name=None, exclude_id=None, with_vectors=False):
+        """
+        Cherche les documents les plus proches d'un vecteur par produit scalaire sur les vecteurs normalisés.
+
+        Args:
+            vector (list[float]): Vecteur de la question.
+            limit (int, optional): Nombre de documents à renvoyer. Defaults to 5.
+            course_name (str, optional): Ne parcourir que la plage de lignes de ce cours. Defaults to None.
+            exclude_id (str, optional): Document à exclure des résultats. Defaults to None.
+            with_vectors (bool, optional): Joindre le vecteur (normalisé) de chaque document. Defaults to False.
+
+        Returns:
+            list[SimilarDocument]: Documents du plus proche au plus lointain.
+        """
+        index = self._load()
+        matrix = index["matrix"]
+        if course_name:
+            start, end = index["courses"].get(course_name, (0, 0))
+        else:
+            start, end = 0, matrix.shape[0]
+        if end <= start or limit <= 0:
+            return []
+
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        scores = np.empty(end - start, dtype=np.float32)
+        for block in range(start, end, SEARCH_BLOCK_SIZE):
+            stop = min(block + SEARCH_BLOCK_SIZE, end)
+            scores[block - start:stop - start] = matrix[block:stop].astype(np.float32, copy=False) @ query
+        excluded = index["positions"].get(exclude_id) if exclude_id else None
+        if excluded is not None and start <= excluded < end:
+            scores[excluded - start] = -np.inf
+
+        k = min(limit, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        results = []
+        for offset in top:
+            if not np.isfinite(scores[offset]):
+                continue
+            row = start + int(offset)
+            results.append(SimilarDocument(
+                index["ids"][row],
+                float(scores[offset]),
+                course_name or self._course_of(index, row),
+                index["thread_ids"][row],
+                np.array(matrix[row], dtype=np.float32) if with_vectors else None
+            ))
+        return results
+
+    def similarity(self, id1, id2):
+        """
+        Calcule la similarité cosinus entre deux documents de l'index.
+
+        Args:
+            id1 (str): Identifiant du premier document.
+            id2 (str): Identifiant du deuxième document.
+
+        Returns:
+            float: La similarité, ou None si l'un des documents n'est pas dans l'index.
+        """
+        index = self._load()
+        row1 = index["positions"].get(id1)
+        row2 = index["positions"].get(id2)
+        if row1 is None or row2 is None:
+            return None
+        matrix = index["matrix"]
+        return float(matrix[row1].astype(np.float32) @ matrix[row2].astype(np.float32))
@@ -0,0 +1,153 @@
+import time
+import queue
+import threading
+
+_FIN = object()
+
+
+class StageStats:
+    """Temps passé par une étape du pipeline : à travailler, à attendre son entrée et à attendre l'étape suivante."""
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.busy = 0.0
+        self.wait_input = 0.0
+        self.wait_output = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, busy=0.0, wait_input=0.0, wait_output=0.0, items=0):
+        with self._lock:
+            self.busy += busy
+            self.wait_input += wait_input
+            self.wait_output += wait_output
+            self.items += items
+
+    def to_dict(self):
+        return {
+            "items": self.items,
+            "busy_s": round(self.busy, 2),
+            "wait_input_s": round(self.wait_input, 2),
+            "wait_output_s": round(self.wait_output, 2),
+        }
+
+
+def _put(q, item, stop):
+    """Dépose un élément dans une file bornée, en abandonnant si le pipeline est arrêté."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def _get(q, stop):
+    """Retire un élément d'une file, en abandonnant si le pipeline est arrêté."""
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.5)
+        except queue.Empty:
+            continue
+    return _FIN
+
+def run_embedding_pipeline(read_batches, encode, write, queue_size=4, encode_workers=1):
+    """
+    Exécute en parallèle les trois étapes lecture → encodage → écriture, reliées par des files bornées.
+
+    La lecture remplit la première file tant qu'elle n'est pas pleine (contre-pression), les workers
+    d'encodage consomment la première file et remplissent la seconde, l'écriture consomme la seconde.
+    Une erreur dans n'importe quelle étape arrête tout le pipeline et est relancée à l'appelant.
+
+    Args:
+        read_batches (callable): Fonction sans argument qui renvoie un itérable de lots.
+        encode (callable): Fonction appliquée à chaque lot lu, exécutée par les workers d'encodage.
+        write (callable): Fonction appliquée à chaque résultat d'encodage, dans un seul thread.
+        queue_size (int, optional): Nombre maximal de lots en attente entre deux étapes. Defaults to 4.
+        encode_workers (int, optional): Nombre de threads d'encodage. Defaults to 1.
+
+    Returns:
+        dict: Statistiques de chaque étape (temps de travail, d'attente et nombre de lots) et durée totale.
+    """
+    stats = {name: StageStats(name) for name in ("read", "encode", "write")}
+    read_queue = queue.Queue(maxsize=queue_size)
+    write_queue = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    errors = []
+
+    def fail(e):
+        errors.append(e)
+        stop.set()
+
+    def reader():
+        try:
+            iterator = iter(read_batches())
+            while True:
+                start = time.time()
+                batch = next(iterator, _FIN)
+                if batch is _FIN:
+                    break
+                read_time = time.time() - start
+                start = time.time()
+                if not _put(read_queue, batch, stop):
+                    return
+                stats["read"].add(busy=read_time, wait_output=time.time() - start, items=1)
+        except Exception as e:
+            fail(e)
+        finally:
+            for _ in range(encode_workers):
+                _put(read_queue, _FIN, stop)
+
+    def encoder():
+        try:
+            while True:
+                start = time.time()
+                batch = _get(read_queue, stop)
+                wait = time.time() - start
+                if batch is _FIN:
+                    break
+                start = time.time()
+                result = encode(batch)
+                busy = time.time() - start
+                start = time.time()
+                if not _put(write_queue, result, stop):
+                    return
+                stats["encode"].add(busy=busy, wait_input=wait, wait_output=time.time() - start, items=1)
+        except Exception as e:
+            fail(e)
+        finally:
+            _put(write_queue, _FIN, stop)
+
+    def writer():
+        remaining = encode_workers
+        try:
+            while remaining:
+                start = time.time()
+                result = _get(write_queue, stop)
+                wait = time.time() - start
+                if result is _FIN:
+                    remaining -= 1
+                    continue
+                start = time.time()
+                write(result)
+                stats["write"].add(busy=time.time() - start, wait_input=wait, items=1)
+        except Exception as e:
+            fail(e)
+
+    start = time.time()
+    threads = [threading.Thread(target=reader, name="embedding-read")]
+    threads += [threading.Thread(target=encoder, name=f"embedding-encode-{i}") for i in range(encode_workers)]
+    threads.append(threading.Thread(target=writer, name="embedding-write"))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        raise errors[0]
+
+    report = {name: stage.to_dict() for name, stage in stats.items()}
+    report["total_s"] = round(time.time() - start, 2)
+    # L'étape qui travaille le plus longtemps limite le débit du pipeline
+    report["bottleneck"] = max(("read", "encode", "write"), key=lambda name: stats[name].busy / max(1, encode_workers if name == "encode" else 1))
+    return report
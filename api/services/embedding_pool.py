@@ -0,0 +1,86 @@
+import os
+import sys
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from api import config
+
+
+def _init_worker(torch_threads):
+    """Initialise un processus d'encodage : nombre de threads torch, puis chargement du modèle."""
+    import torch
+    torch.set_num_threads(torch_threads)
+    from api.services.embedding import get_embedding_model
+    get_embedding_model()
+
+def _encode(messages, batch_size):
+    from api.services.embedding import get_embedding_model
+    return get_embedding_model().encode(messages, batch_size=batch_size)
+
+def _split(texts):
+    from api.services.embedding import split_chunks
+    return [split_chunks(text) for text in texts]
+
+
+class EncodingPool:
+    """
+    Pool de processus qui chargent chacun le modèle d'embedding, pour encoder plusieurs lots en parallèle sur CPU.
+
+    Un lot est encodé entièrement par un seul processus : les vecteurs reviennent dans l'ordre des messages.
+    """
+
+    def __init__(self, processes, torch_threads=None):
+        """
+        Args:
+            processes (int): Nombre de processus d'encodage.
+            torch_threads (int, optional): Threads torch par processus. Defaults to nombre de cœurs / processes.
+        """
+        self.processes = processes
+        self.torch_threads = torch_threads or max(1, (os.cpu_count() or 1) // processes)
+        # spawn : torch ne supporte pas d'être utilisé après un fork
+        self._executor = ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.torch_threads,)
+        )
+
+    def encode(self, messages, batch_size=None):
+        """
+        Encode une liste de messages dans l'un des processus du pool (bloque jusqu'au résultat).
+
+        Args:
+            messages (list[str]): Les messages à encoder.
+            batch_size (int, optional): Taille des lots passés au modèle. Defaults to config.EMBEDDING_BATCH_SIZE.
+
+        Returns:
+            list[list[float]]: Un vecteur d'embedding par message, dans le même ordre.
+        """
+        if not messages:
+            return []
+        return self._executor.submit(_encode, messages, batch_size or config.EMBEDDING_BATCH_SIZE).result().tolist()
+
+    def split(self, texts):
+        """
+        Découpe des messages en fenêtres (voir split_chunks) dans l'un des processus du pool,
+        pour que le processus principal n'ait pas à charger le modèle et son tokenizer.
+
+        Args:
+            texts (list[str]): Les messages à découper.
+
+        Returns:
+            list[list[str]]: Les fenêtres de chaque message, dans le même ordre.
+        """
+        if not texts:
+            return []
+        return self._executor.submit(_split, texts).result()
+
+    def close(self):
+        """Arrête les processus du pool."""
+        self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,669 @@
+import io
+import time
+import hashlib
+import unicodedata
+from psycopg2 import sql
+from psycopg2.extras import execute_values
+
+
+# Copies compactes de embedding.vector, utilisées pour la recherche des candidats avant recalcul exact
+COMPACT_COLUMNS = {
+    "halfvec": {
+        "column": "vector_half",
+        "type": "halfvec(384)",
+        "expression": "vector::halfvec(384)",
+        "distance": "vector_half <=> %s::vector::halfvec(384)",
+        "opclass": "halfvec_cosine_ops",
+    },
+    "bit": {
+        "column": "vector_bits",
+        "type": "bit(384)",
+        "expression": "binary_quantize(vector)::bit(384)",
+        "distance": "vector_bits <~> binary_quantize(%s::vector)::bit(384)",
+        "opclass": "bit_hamming_ops",
+    },
+}
+
+
+def hash_body(body):
+    """
+    Calcule l'empreinte du contenu d'un message.
+
+    Args:
+        body (str): Contenu du message.
+
+    Returns:
+        str: Empreinte SHA-256 hexadécimale.
+    """
+    return hashlib.sha256((body or "").encode("utf-8")).hexdigest()
+
+def normalize_body(body):
+    """
+    Normalise le contenu d'un message avant encodage (forme NFC, espaces superflus retirés).
+
+    Args:
+        body (str): Contenu du message.
+
+    Returns:
+        str: Contenu normalisé.
+    """
+    return " ".join(unicodedata.normalize("NFC", body or "").split())
+
+def hash_text(body):
+    """
+    Calcule l'empreinte du contenu normalisé d'un message : deux messages de même empreinte partagent le même vecteur.
+
+    Args:
+        body (str): Contenu du message.
+
+    Returns:
+        str: Empreinte SHA-256 hexadécimale.
+    """
+    return hash_body(normalize_body(body))
+
+def format_vector(vector):
+    """
+    Convertit un vecteur en littéral pgvector ("[x1,x2,...]").
+
+    Args:
+        vector (list[float] | numpy.ndarray): Vecteur à convertir.
+
+    Returns:
+        str: Littéral accepté par le type vector.
+    """
+    if isinstance(vector, str):
+        # Déjà au format pgvector (vecteur relu depuis la table embedding, voir get_text_vectors)
+        return vector
+    # 9 chiffres significatifs suffisent à représenter exactement un float32
+    return "[" + ",".join(f"{float(x):.9g}" for x in vector) + "]"
+
+
+def create_body_hash_column(conn):
+    """
+    Ajoute à la table embedding la colonne body_hash, empreinte du contenu encodé, et son index.
+
+    L'index sert à retrouver le vecteur d'un contenu déjà encodé (voir get_text_vectors).
+
+    Args:
+        conn: Connexion à la base de données.
+    """
+    with conn.cursor() as cur:
+        cur.execute("ALTER TABLE embedding ADD COLUMN IF NOT EXISTS body_hash TEXT")
+        cur.execute("CREATE INDEX IF NOT EXISTS embedding_body_hash_idx ON embedding (body_hash)")
+        # Ancienne copie des vecteurs par contenu, remplacée par la recherche sur embedding.body_hash
+        cur.execute("DROP TABLE IF EXISTS embedding_text")
+    conn.commit()
+
+# Cours et thread d'un embedding, à partir de son id (thread) ou de son thread_id (message)
+COURSE_JOIN = """
+    LEFT JOIN threads t1 ON t1.id = {alias}.id
+    LEFT JOIN threads t2 ON t2.id = {alias}.thread_id
+    LEFT JOIN courses c ON c.id = COALESCE(t1.course_id, t2.course_id)"""
+COURSE_COLUMNS = "{alias}.thread_id, COALESCE(t1.course_id, t2.course_id)::text, c.name"
+
+
+def create_course_columns(conn):
+    """
+    Ajoute à la table embedding le thread et le cours de chaque document, ainsi que l'index par cours.
+
+    Args:
+        conn: Connexion à la base de données.
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            ALTER TABLE embedding
+                ADD COLUMN IF NOT EXISTS thread_id TEXT,
+                ADD COLUMN IF NOT EXISTS course_id TEXT,
+                ADD COLUMN IF NOT EXISTS course_name TEXT
+            """)
+        cur.execute("CREATE INDEX IF NOT EXISTS embedding_course_name_idx ON embedding (course_name)")
+    conn.commit()
+
+def backfill_course_columns(conn, batch_size=10000):
+    """
+    Renseigne course_id et course_name des lignes existantes de embedding, par lots d'ids.
+
+    Args:
+        conn: Connexion à la base de données.
+        batch_size (int, optional): Nombre de lignes mises à jour par transaction. Defaults to 10000.
+
+    Returns:
+        int: Nombre de lignes mises à jour.
+    """
+    create_course_columns(conn)
+    updated = 0
+    last_id = ""
+    while True:
+        with conn.cursor() as cur:
+            cur.execute("SELECT id FROM embedding WHERE id > %s ORDER BY id LIMIT %s", (last_id, batch_size))
+            ids = [row[0] for row in cur.fetchall()]
+            if not ids:
+                break
+            cur.execute(f"""
+                UPDATE embedding e
+                SET course_id = src.course_id, course_name = src.course_name
+                FROM (
+                    SELECT e.id, {COURSE_COLUMNS.format(alias="e")}
+                    FROM embedding e{COURSE_JOIN.format(alias="e")}
+                    WHERE e.id = ANY(%s)
+                ) AS src(id, thread_id, course_id, course_name)
+                WHERE e.id = src.id AND e.course_name IS DISTINCT FROM src.course_name
+                """, (ids,))
+            updated += cur.rowcount
+        conn.commit()
+        last_id = ids[-1]
+    return updated
+
+def course_columns_pending(conn):
+    """
+    Indique si des embeddings n'ont pas encore leur cours alors qu'il peut être résolu (voir backfill_course_columns).
+
+    Args:
+        conn: Connexion à la base de données.
+
+    Returns:
+        bool: True si les colonnes n'ont pas encore été ajoutées ou s'il reste des lignes à renseigner.
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT EXISTS (
+                SELECT 1 FROM information_schema.columns
+                WHERE table_schema = ANY(current_schemas(false)) AND table_name = 'embedding' AND column_name = 'course_name'
+            )
+            """)
+        if not cur.fetchone()[0]:
+            conn.commit()
+            return True
+        cur.execute(f"""
+            SELECT EXISTS (
+                SELECT 1
+                FROM embedding e{COURSE_JOIN.format(alias="e")}
+                WHERE e.course_name IS NULL AND c.name IS NOT NULL
+            )
+            """)
+        pending = cur.fetchone()[0]
+    conn.commit()
+    return pending
+
+def create_course_vector_indexes(conn, method="hnsw", min_rows=5000, m=16, ef_construction=64):
+    """
+    Crée un index ANN partiel (WHERE course_name = ...) pour chaque cours assez volumineux.
+
+    Une recherche filtrée sur un cours parcourt alors uniquement l'index de ce cours ; les petits cours
+    sont servis par l'index B-tree sur course_name et un tri exact.
+
+    Args:
+        conn: Connexion à la base de données.
+        method (str, optional): "hnsw" ou "ivfflat". Defaults to "hnsw".
+        min_rows (int, optional): Nombre minimal d'embeddings d'un cours pour lui créer un index. Defaults to 5000.
+        m (int, optional): HNSW : nombre de voisins par nœud. Defaults to 16.
+        ef_construction (int, optional): HNSW : taille de la liste de candidats à la construction. Defaults to 64.
+
+    Returns:
+        list[str]: Noms des index créés.
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT course_name, count(*)
+            FROM embedding
+            WHERE course_name IS NOT NULL
+            GROUP BY course_name
+            HAVING count(*) >= %s
+            """, (min_rows,))
+        courses = cur.fetchall()
+    names = []
+    for course_name, count in courses:
+        # Nom dérivé d'une empreinte de la valeur filtrée : un id tronqué confondait les sessions d'un même cours
+        name = "embedding_vector_{}_c_{}_idx".format(method, hashlib.sha1(course_name.encode("utf-8")).hexdigest()[:12])
+        if method == "hnsw":
+            options = f"m = {int(m)}, ef_construction = {int(ef_construction)}"
+        else:
+            options = f"lists = {max(10, count // 1000)}"
+        with conn.cursor() as cur:
+            cur.execute(sql.SQL("""
+                CREATE INDEX IF NOT EXISTS {name} ON embedding USING {method} (vector vector_cosine_ops)
+                WITH ({options}) WHERE course_name = {course_name}
+                """).format(
+                    name=sql.Identifier(name),
+                    method=sql.SQL(method),
+                    options=sql.SQL(options),
+                    course_name=sql.Literal(course_name)
+                ))
+        conn.commit()
+        names.append(name)
+    return names
+
+def get_text_vectors(conn, hashes):
+    """
+    Récupère les vecteurs déjà calculés pour une liste d'empreintes, depuis un document de même contenu.
+
+    Args:
+        conn: Connexion à la base de données.
+        hashes (list[str]): Empreintes de contenus normalisés.
+
+    Returns:
+        dict: {empreinte: vecteur au format pgvector} pour les empreintes connues.
+    """
+    if not hashes:
+        return {}
+    with conn.cursor() as cur:
+        cur.execute("SELECT DISTINCT ON (body_hash) body_hash, vector::text FROM embedding WHERE body_hash = ANY(%s)", (list(hashes),))
+        return {row[0]: row[1] for row in cur.fetchall()}
+
+def create_chunk_table(conn):
+    """
+    Crée la table embedding_chunk, qui contient un vecteur par fenêtre des messages trop longs pour le modèle.
+
+    Args:
+        conn: Connexion à la base de données.
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS embedding_chunk (
+            id TEXT NOT NULL REFERENCES embedding(id) ON DELETE CASCADE,
+            chunk INTEGER NOT NULL,
+            vector vector(384) NOT NULL,
+            PRIMARY KEY (id, chunk)
+        )
+        """)
+    conn.commit()
+
+def get_text_chunks(conn, hashes):
+    """
+    Récupère les vecteurs de fenêtres déjà calculés pour des contenus, à partir d'un document qui les partage.
+
+    Args:
+        conn: Connexion à la base de données.
+        hashes (list[str]): Empreintes de contenus normalisés.
+
+    Returns:
+        dict: {empreinte: [vecteurs au format pgvector, dans l'ordre des fenêtres]} pour les contenus découpés.
+    """
+    if not hashes:
+        return {}
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT DISTINCT ON (e.body_hash, ch.chunk) e.body_hash, ch.chunk, ch.vector::text
+            FROM embedding_chunk ch
+            JOIN embedding e ON e.id = ch.id
+            WHERE e.body_hash = ANY(%s)
+            ORDER BY e.body_hash, ch.chunk
+            """, (list(hashes),))
+        chunks = {}
+        for body_hash, _, vector in cur.fetchall():
+            chunks.setdefault(body_hash, []).append(vector)
+        return chunks
+
+def create_compact_column(conn, kind, index=True):
+    """
+    Ajoute à la table embedding une copie compacte du vecteur, calculée par PostgreSQL (colonne générée).
+
+    Les lignes existantes sont converties par l'ALTER TABLE ; les suivantes le sont à l'insertion, sans changer l'ingestion.
+
+    Args:
+        conn: Connexion à la base de données.
+        kind (str): "halfvec" (float16, deux fois plus petit) ou "bit" (quantification binaire, 32 fois plus petit).
+        index (bool, optional): Créer aussi un index HNSW sur la copie compacte. Defaults to True.
+    """
+    compact = COMPACT_COLUMNS[kind]
+    with conn.cursor() as cur:
+        cur.execute(f"""
+            ALTER TABLE embedding ADD COLUMN IF NOT EXISTS {compact['column']} {compact['type']}
+            GENERATED ALWAYS AS ({compact['expression']}) STORED
+            """)
+        if index:
+            cur.execute(f"CREATE INDEX IF NOT EXISTS embedding_{compact['column']}_idx ON embedding USING hnsw ({compact['column']} {compact['opclass']})")
+    conn.commit()
+
+def drop_compact_column(conn, kind):
+    """
+    Supprime la copie compacte du vecteur (et son index).
+
+    Args:
+        conn: Connexion à la base de données.
+        kind (str): "halfvec" ou "bit".
+    """
+    with conn.cursor() as cur:
+        cur.execute(f"ALTER TABLE embedding DROP COLUMN IF EXISTS {COMPACT_COLUMNS[kind]['column']}")
+    conn.commit()
+
+def vector_index_name(table, method, column="vector"):
+    """
+    Retourne le nom de l'index ANN d'une colonne vecteur.
+
+    Args:
+        table (str): "embedding" ou "embedding_chunk".
+        method (str): "hnsw" ou "ivfflat".
+        column (str, optional): Colonne indexée. Defaults to "vector".
+
+    Returns:
+        str: Nom de l'index.
+    """
+    return f"{table}_{column}_{method}_idx"
+
+def create_vector_index(conn, method="hnsw", table="embedding", m=16, ef_construction=64, lists=None, concurrently=False):
+    """
+    Crée un index ANN (distance cosinus) sur la colonne vector d'une table.
+
+    Args:
+        conn: Connexion à la base de données.
+        method (str, optional): "hnsw" ou "ivfflat". Defaults to "hnsw".
+        table (str, optional): "embedding" ou "embedding_chunk". Defaults to "embedding".
+        m (int, optional): HNSW : nombre de voisins par nœud. Defaults to 16.
+        ef_construction (int, optional): HNSW : taille de la liste de candidats à la construction. Defaults to 64.
+        lists (int, optional): IVFFlat : nombre de listes. Defaults to nombre de lignes / 1000 (au moins 10).
+        concurrently (bool, optional): Construire sans bloquer les écritures (plus lent). Defaults to False.
+
+    Returns:
+        str: Nom de l'index créé.
+    """
+    if method not in ("hnsw", "ivfflat"):
+        raise ValueError(f"Méthode d'index inconnue : {method}")
+    name = vector_index_name(table, method)
+    autocommit = conn.autocommit
+    if concurrently:
+        # CREATE INDEX CONCURRENTLY ne peut pas s'exécuter dans une transaction
+        conn.commit()
+        conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            if method == "hnsw":
+                options = f"m = {int(m)}, ef_construction = {int(ef_construction)}"
+            else:
+                if lists is None:
+                    # Recommandation pgvector : lignes / 1000 jusqu'à un million de lignes
+                    cur.execute(f"SELECT count(*) FROM {table}")
+                    lists = max(10, cur.fetchone()[0] // 1000)
+                options = f"lists = {int(lists)}"
+            cur.execute(f"""
+                CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS {name}
+                ON {table} USING {method} (vector vector_cosine_ops) WITH ({options})
+                """)
+        if not concurrently:
+            conn.commit()
+    finally:
+        conn.autocommit = autocommit
+    return name
+
+def drop_vector_index(conn, method="hnsw", table="embedding"):
+    """
+    Supprime l'index ANN d'une table.
+
+    Args:
+        conn: Connexion à la base de données.
+        method (str, optional): "hnsw" ou "ivfflat". Defaults to "hnsw".
+        table (str, optional): "embedding" ou "embedding_chunk". Defaults to "embedding".
+    """
+    with conn.cursor() as cur:
+        cur.execute(f"DROP INDEX IF EXISTS {vector_index_name(table, method)}")
+    conn.commit()
+
+def list_vector_indexes(conn):
+    """
+    Liste les index ANN des tables d'embedding, avec leur taille.
+
+    Args:
+        conn: Connexion à la base de données.
+
+    Returns:
+        list[dict]: Nom, table, définition et taille de chaque index hnsw/ivfflat.
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT i.indexname, i.tablename, i.indexdef, pg_size_pretty(pg_relation_size(format('%I.%I', i.schemaname, i.indexname)::regclass))
+            FROM pg_indexes i
+            WHERE i.tablename IN ('embedding', 'embedding_chunk')
+              AND (i.indexdef ILIKE '%USING hnsw%' OR i.indexdef ILIKE '%USING ivfflat%')
+            ORDER BY i.tablename, i.indexname
+            """)
+        return [{"name": row[0], "table": row[1], "definition": row[2], "size": row[3]} for row in cur.fetchall()]
+
+def set_search_params(cur, ef_search=None, probes=None):
+    """
+    Règle, pour la transaction en cours, le compromis précision/vitesse des index ANN.
+
+    Args:
+        cur: Curseur de la transaction qui exécute la recherche.
+        ef_search (int, optional): HNSW : taille de la liste de candidats (plus grand = meilleur recall). Defaults to None.
+        probes (int, optional): IVFFlat : nombre de listes parcourues. Defaults to None.
+    """
+    if ef_search:
+        cur.execute(f"SET LOCAL hnsw.ef_search = {int(ef_search)}")
+    if probes:
+        cur.execute(f"SET LOCAL ivfflat.probes = {int(probes)}")
+
+def get_body_hashes(conn, ids):
+    """
+    Récupère l'empreinte du contenu encodé pour une liste d'ids.
+
+    Args:
+        conn: Connexion à la base de données.
+        ids (list[str]): Identifiants des documents.
+
+    Returns:
+        dict: {id: body_hash} pour les ids qui ont déjà un embedding (body_hash peut être None pour les anciennes lignes).
+    """
+    if not ids:
+        return {}
+    with conn.cursor() as cur:
+        cur.execute("SELECT id, body_hash FROM embedding WHERE id = ANY(%s)", (list(ids),))
+        return {row[0]: row[1] for row in cur.fetchall()}
+
+def get_ids_without_body_hash(conn):
+    """
+    Récupère les ids des embeddings calculés avant l'ajout de la colonne body_hash.
+
+    Args:
+        conn: Connexion à la base de données.
+
+    Returns:
+        list[str]: Ids dont body_hash est NULL.
+    """
+    with conn.cursor() as cur:
+        cur.execute("SELECT id FROM embedding WHERE body_hash IS NULL")
+        return [row[0] for row in cur.fetchall()]
+
+def set_body_hashes(conn, hashes):
+    """
+    Renseigne l'empreinte du contenu des lignes qui n'en ont pas, sans toucher à leur vecteur.
+
+    Args:
+        conn: Connexion à la base de données.
+        hashes (list[tuple]): Tuples (id, body_hash).
+    """
+    if not hashes:
+        return
+    with conn.cursor() as cur:
+        execute_values(cur,
+            """
+            UPDATE embedding e SET body_hash = v.body_hash
+            FROM (VALUES %s) AS v(id, body_hash)
+            WHERE e.id = v.id AND e.body_hash IS NULL
+            """,
+            hashes
+        )
+    conn.commit()
+
+def delete_embeddings(conn, ids):
+    """
+    Supprime les embeddings des documents supprimés.
+
+    Args:
+        conn: Connexion à la base de données.
+        ids (list[str]): Identifiants des documents.
+    """
+    if not ids:
+        return
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM embedding WHERE id = ANY(%s)", (list(ids),))
+    conn.commit()
+
+
+class EmbeddingWriter:
+    """Écrit les embeddings en masse sur une connexion PostgreSQL unique, avec un commit par lot."""
+
+    def __init__(self, conn, method="copy", page_size=1000, upsert=False):
+        """
+        Args:
+            conn: Connexion à la base de données, gardée ouverte pendant toute l'écriture.
+            method (str, optional): "copy" (COPY ... FROM STDIN via une table temporaire) ou "values" (execute_values). Defaults to "copy".
+            page_size (int, optional): Nombre de lignes par requête pour execute_values. Defaults to 1000.
+            upsert (bool, optional): Remplacer le vecteur des ids déjà présents dont l'empreinte a changé,
+                au lieu de les ignorer. Defaults to False.
+        """
+        if method not in ("copy", "values"):
+            raise ValueError(f"Méthode d'écriture inconnue : {method}")
+        self.conn = conn
+        self.method = method
+        self.page_size = page_size
+        self.upsert = upsert
+        self.rows_written = 0
+        self.write_time = 0.0
+        self._staging_ready = False
+        self.chunks_written = 0
+
+    def _ensure_staging(self, cur):
+        if not self._staging_ready:
+            cur.execute("CREATE TEMP TABLE IF NOT EXISTS embedding_staging (id TEXT, vector vector, body_hash TEXT, thread_id TEXT) ON COMMIT DELETE ROWS")
+            self._staging_ready = True
+
+    def _on_conflict(self):
+        if self.upsert:
+            return """ON CONFLICT (id) DO UPDATE SET vector = EXCLUDED.vector, body_hash = EXCLUDED.body_hash,
+                    thread_id = EXCLUDED.thread_id, course_id = EXCLUDED.course_id, course_name = EXCLUDED.course_name
+                WHERE embedding.body_hash IS DISTINCT FROM EXCLUDED.body_hash"""
+        return "ON CONFLICT (id) DO NOTHING"
+
+    def write(self, rows, chunks=None):
+        """
+        Insère un lot d'embeddings puis valide la transaction.
+
+        Les ids déjà présents sont ignorés, ou mis à jour si upsert est activé et que l'empreinte a changé.
+        Le cours de chaque document est résolu à l'insertion (voir create_course_columns).
+
+        Args:
+            rows (list[tuple]): Tuples (id, vecteur, empreinte du contenu, thread_id).
+            chunks (list[tuple], optional): Tuples (id, numéro de fenêtre, vecteur) des messages longs,
+                écrits dans embedding_chunk après les documents. Defaults to None.
+
+        Returns:
+            int: Nombre de lignes envoyées.
+        """
+        if not rows:
+            return 0
+        # Un même id deux fois dans le lot ferait échouer ON CONFLICT DO UPDATE : garder sa dernière version
+        rows = list({row[0]: row for row in rows}.values())
+        if chunks:
+            chunks = list({(id, chunk): (id, chunk, vector) for id, chunk, vector in chunks}.values())
+        start = time.time()
+        try:
+            with self.conn.cursor() as cur:
+                if self.method == "copy":
+                    self._ensure_staging(cur)
+                    buffer = io.StringIO()
+                    for id, vector, body_hash, thread_id in rows:
+                        buffer.write(f"{id}\t{format_vector(vector)}\t{body_hash}\t{thread_id or chr(92) + 'N'}\n")
+                    buffer.seek(0)
+                    cur.copy_expert("COPY embedding_staging (id, vector, body_hash, thread_id) FROM STDIN", buffer)
+                    cur.execute(f"""
+                        INSERT INTO embedding (id, vector, body_hash, thread_id, course_id, course_name)
+                        SELECT DISTINCT ON (s.id) s.id, s.vector, s.body_hash, {COURSE_COLUMNS.format(alias="s")}
+                        FROM embedding_staging s{COURSE_JOIN.format(alias="s")}
+                        {self._on_conflict()}
+                        """)
+                else:
+                    execute_values(cur,
+                        f"""
+                        INSERT INTO embedding (id, vector, body_hash, thread_id, course_id, course_name)
+                        SELECT s.id, s.vector, s.body_hash, {COURSE_COLUMNS.format(alias="s")}
+                        FROM (VALUES %s) AS s(id, vector, body_hash, thread_id){COURSE_JOIN.format(alias="s")}
+                        {self._on_conflict()}
+                        """,
+                        [(id, format_vector(vector), body_hash, thread_id) for id, vector, body_hash, thread_id in rows],
+                        template="(%s, %s::vector, %s, %s)",
+                        page_size=self.page_size
+                    )
+                if self.upsert and chunks is not None:
+                    # Un contenu modifié peut avoir moins de fenêtres qu'avant
+                    cur.execute("DELETE FROM embedding_chunk WHERE id = ANY(%s)", ([row[0] for row in rows],))
+                if chunks:
+                    execute_values(cur,
+                        "INSERT INTO embedding_chunk (id, chunk, vector) VALUES %s ON CONFLICT (id, chunk) DO UPDATE SET vector = EXCLUDED.vector",
+                        [(id, chunk, format_vector(vector)) for id, chunk, vector in chunks],
+                        template="(%s, %s, %s::vector)",
+                        page_size=self.page_size
+                    )
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            self._staging_ready = False
+            raise
+        self.rows_written += len(rows)
+        self.chunks_written += len(chunks or [])
+        self.write_time += time.time() - start
+        return len(rows)
+
+    def stats(self):
+        """
+        Retourne le nombre de lignes écrites et le débit d'écriture.
+
+        Returns:
+            dict: Lignes et fenêtres écrites, temps passé à écrire et lignes par seconde.
+        """
+        return {
+            "rows_written": self.rows_written,
+            "chunks_written": self.chunks_written,
+            "write_time": self.write_time,
+            "rows_per_second": self.rows_written / self.write_time if self.write_time else None,
+        }
+
+
+def create_sync_state_table(conn):
+    """
+    Crée la table embedding_sync_state, qui garde la position des traitements d'embedding.
+
+    Args:
+        conn: Connexion à la base de données.
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS embedding_sync_state (
+            name TEXT PRIMARY KEY,
+            position TEXT,
+            updated_at TIMESTAMP NOT NULL DEFAULT now()
+        )
+        """)
+    conn.commit()
+
+def get_sync_position(conn, name):
+    """
+    Récupère la dernière position enregistrée d'un traitement.
+
+    Args:
+        conn: Connexion à la base de données.
+        name (str): Nom du traitement (ex: "backfill").
+
+    Returns:
+        str | None: La position, ou None si le traitement n'a jamais tourné.
+    """
+    create_sync_state_table(conn)
+    with conn.cursor() as cur:
+        cur.execute("SELECT position FROM embedding_sync_state WHERE name = %s", (name,))
+        row = cur.fetchone()
+    return row[0] if row else None
+
+def set_sync_position(conn, name, position):
+    """
+    Enregistre la position d'un traitement.
+
+    Args:
+        conn: Connexion à la base de données.
+        name (str): Nom du traitement.
+        position (str | None): Nouvelle position (None pour repartir du début).
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO embedding_sync_state (name, position) VALUES (%s, %s)
+            ON CONFLICT (name) DO UPDATE SET position = EXCLUDED.position, updated_at = now()
+            """, (name, position))
+    conn.commit()
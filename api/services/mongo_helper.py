@@ -1,5 +1,6 @@
 from pymongo import MongoClient
 import os
+from datetime import datetime, timezone
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -19,6 +20,55 @@ def get_data_for_thread(mongo_url, collection_name, id):
     result = client[collection_name]['documents'].find_one({'_id': id})
     return result
 
+def parse_mongo_date(value):
+    """
+    Convertit une date de document MongoDB en datetime UTC.
+
+    Selon les imports, created_at/updated_at sont des dates BSON (datetime sans fuseau, en UTC, côté pymongo)
+    ou des chaînes ISO 8601 en UTC (ex: "2019-03-12T09:41:07.123Z").
+
+    Args:
+        value (datetime | str): Date BSON ou chaîne ISO 8601.
+
+    Returns:
+        datetime: La date avec le fuseau UTC, ou None si la valeur est absente ou illisible.
+    """
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+def modified_since_filter(since):
+    """
+    Construit le filtre des documents créés ou modifiés depuis une date, quel que soit le type stocké.
+
+    MongoDB ne compare pas une chaîne à une date BSON : le filtre teste donc les deux formes. La forme chaîne
+    est tronquée à la seconde (sans fuseau), ce qui la place avant toute chaîne ISO UTC de la même seconde.
+
+    Args:
+        since (datetime | str): Date de départ (incluse), datetime ou chaîne ISO 8601.
+
+    Returns:
+        dict: Filtre MongoDB sur updated_at et created_at.
+    """
+    since = parse_mongo_date(since)
+    if since is None:
+        raise ValueError("Date de départ invalide, format attendu : ISO 8601 (ex: 2024-01-01T00:00:00)")
+    as_string = since.strftime("%Y-%m-%dT%H:%M:%S")
+    # pymongo compare les datetime sans fuseau comme des dates UTC
+    as_date = since.replace(tzinfo=None)
+    return {"$or": [
+        {field: {"$gte": value}}
+        for field in ("updated_at", "created_at")
+        for value in (as_date, as_string)
+    ]}
+
 if __name__ == "__main__":
     mongo_url = os.getenv("MONGO_URL")
     if not mongo_url:
@@ -1,32 +1,269 @@
 from pymongo import MongoClient
-from transformers import AutoTokenizer, AutoModelForSequenceClassification # type: ignore
 import numpy as np
 import os
+import sys
+import time
+import threading
 from dotenv import load_dotenv
-import torch
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from api import config
+from api.services.sentiment_backends import load_backend
+from api.services.sentiment_store import SentimentCacheStats, hash_body, sentiment_model_key, open_sentiment_store, get_cached_sentiments, save_sentiments
+from api.services.sentiment_aggregates import refresh_aggregates
+from api.services.thread_tree import iter_thread_messages, message_fields
 load_dotenv()
 
-def analyse_sentiment_long_texte(texte, model_name="tabularisai/multilingual-sentiment-analysis", 
-                               taille_fenetre=384, chevauchement=128):
+
+def max_rss_mb():
+    """
+    Retourne le pic de mémoire résidente du processus en Mo.
+
+    Le module resource n'existe pas sous Windows : on se rabat alors sur la mémoire résidente
+    courante donnée par psutil, s'il est installé. ru_maxrss est en octets sous macOS et en Ko ailleurs.
+
+    Returns:
+        float: La mémoire en Mo, ou None si aucune mesure n'est disponible.
+    """
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil # type: ignore
+        except ImportError:
+            return None
+        return psutil.Process().memory_info().rss / 1024 ** 2
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / 1024 ** 2 if sys.platform == "darwin" else max_rss / 1024
+
+
+class SentimentModelRegistry:
+    """Garde en mémoire le tokenizer et le modèle de sentiment, chargés une seule fois par processus."""
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, model_name, device, backend="torch"):
+        self.model_name = model_name
+        self.backend = backend
+        # Les modèles quantifiés int8 ne tournent que sur CPU
+        self.device = "cpu" if backend == "torch_int8" else device
+        self.tokenizer = None
+        self.model = None
+        self.load_time = None
+        self.memory_bytes = None
+        self.max_rss_mb = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls, model_name=None, device=None, backend=None):
+        """
+        Retourne le registre associé au triplet (modèle, device, backend), en le créant si besoin.
+
+        Args:
+            model_name (str, optional): Nom du modèle Hugging Face. Defaults to config.SENTIMENT_MODEL_NAME.
+            device (str, optional): Device torch ("cpu", "cuda", "cuda:0"...). Defaults to config.SENTIMENT_DEVICE.
+            backend (str, optional): "torch", "torch_int8" ou "onnx". Defaults to config.SENTIMENT_BACKEND.
+
+        Returns:
+            SentimentModelRegistry: Le registre partagé par tout le processus.
+        """
+        model_name = model_name or config.SENTIMENT_MODEL_NAME
+        device = device or config.SENTIMENT_DEVICE
+        backend = backend or config.SENTIMENT_BACKEND
+        key = (model_name, device, backend)
+        if key not in cls._instances:
+            with cls._instances_lock:
+                if key not in cls._instances:
+                    cls._instances[key] = cls(model_name, device, backend)
+        return cls._instances[key]
+
+    @property
+    def cache_key(self):
+        """Nom sous lequel les résultats de ce modèle sont stockés dans message_sentiment."""
+        return sentiment_model_key(self.model_name, self.backend)
+
+    def load(self):
+        """
+        Charge le tokenizer et le modèle au premier appel (thread-safe), puis les renvoie depuis la mémoire.
+
+        Returns:
+            tuple: (tokenizer, model)
+        """
+        if self.model is None:
+            with self._lock:
+                if self.model is None:
+                    start = time.time()
+                    # Import différé : transformers et torch ne sont chargés qu'au premier usage du modèle
+                    from transformers import AutoTokenizer # type: ignore
+                    tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+                    model, memory_bytes = load_backend(self.model_name, self.backend, self.device)
+                    self.load_time = time.time() - start
+                    self.memory_bytes = memory_bytes
+                    self.max_rss_mb = max_rss_mb()
+                    self.tokenizer = tokenizer
+                    self.model = model
+                    print(f"Modèle de sentiment {self.model_name} ({self.backend}) chargé sur {self.device} "
+                          f"en {self.load_time:.2f} secondes.")
+        return self.tokenizer, self.model
+
+    def warmup(self):
+        """Charge le modèle et exécute une première inférence pour initialiser les noyaux torch."""
+        import torch
+        tokenizer, model = self.load()
+        inputs = tokenizer("Bonjour", return_tensors="pt").to(self.device)
+        with torch.no_grad():
+            model(**inputs)
+
+    def stats(self):
+        """
+        Retourne les informations de chargement du modèle.
+
+        Returns:
+            dict: Nom du modèle, device, état de chargement, temps de chargement et mémoire utilisée.
+        """
+        return {
+            "model_name": self.model_name,
+            "backend": self.backend,
+            "device": self.device,
+            "loaded": self.model is not None,
+            "load_time": self.load_time,
+            "memory_mb": self.memory_bytes / 1024 ** 2 if self.memory_bytes is not None else None,
+            "max_rss_mb": self.max_rss_mb,
+        }
+
+
+def get_sentiment_model(model_name=None, backend=None):
+    """
+    Retourne le tokenizer et le modèle de sentiment partagés par le processus.
+
+    Args:
+        model_name (str, optional): Nom du modèle. Defaults to config.SENTIMENT_MODEL_NAME.
+        backend (str, optional): Backend d'inférence. Defaults to config.SENTIMENT_BACKEND.
+
+    Returns:
+        tuple: (tokenizer, model, device)
+    """
+    registry = SentimentModelRegistry.get_instance(model_name, backend=backend)
+    tokenizer, model = registry.load()
+    return tokenizer, model, registry.device
+
+def warmup_sentiment_model():
+    """
+    Précharge le modèle de sentiment configuré, à appeler au démarrage de l'API.
+
+    Returns:
+        dict: Les statistiques de chargement du modèle.
+    """
+    registry = SentimentModelRegistry.get_instance()
+    registry.warmup()
+    return registry.stats()
+
+def _predire_probabilites(tokenizer, model, device, sequences):
+    """
+    Exécute une passe avant sur un lot de séquences déjà tokenisées, avec padding dynamique.
+
+    Args:
+        tokenizer: Tokenizer du modèle.
+        model: Modèle de classification.
+        device (str): Device torch.
+        sequences (list[list[int]]): Identifiants de tokens (tokens spéciaux inclus) de chaque séquence.
+
+    Returns:
+        numpy.ndarray: Probabilités par label, de forme (nombre de séquences, nombre de labels).
+    """
+    import torch
+    inputs = tokenizer.pad({"input_ids": sequences}, padding="longest", return_tensors="pt").to(device)
+    with torch.no_grad():
+        outputs = model(**inputs)
+    return torch.nn.functional.softmax(outputs.logits, dim=-1).cpu().numpy()
+
+def iter_sentiment_batches(textes, model_name=None, batch_size=None, max_length=None, chevauchement=128, backend=None):
+    """
+    Analyse le sentiment d'une liste de textes en les regroupant par lots triés par longueur,
+    et renvoie les résultats de chaque lot dès qu'il est calculé.
+
+    Les textes sont tokenisés en une seule fois, puis ceux qui tiennent dans max_length tokens sont
+    regroupés par longueur croissante et passés au modèle lot par lot (un seul padding par lot).
+    Les textes plus longs sont ensuite découpés en fenêtres glissantes à partir des mêmes tokens.
+
+    Args:
+        textes (list[str]): Textes à analyser.
+        model_name (str, optional): Nom du modèle. Defaults to config.SENTIMENT_MODEL_NAME.
+        batch_size (int, optional): Nombre de séquences par passe avant. Defaults to config.SENTIMENT_BATCH_SIZE.
+        max_length (int, optional): Longueur maximale (après padding) d'une séquence. Defaults to config.SENTIMENT_MAX_LENGTH.
+        chevauchement (int, optional): Chevauchement des fenêtres pour les textes longs. Defaults to 128.
+        backend (str, optional): Backend d'inférence. Defaults to config.SENTIMENT_BACKEND.
+
+    Yields:
+        list[tuple]: Pour chaque lot, les couples (index du texte, résultat) au format de analyse_sentiment_long_texte.
+    """
+    batch_size = batch_size or config.SENTIMENT_BATCH_SIZE
+    max_length = max_length or config.SENTIMENT_MAX_LENGTH
+    tokenizer, model, device = get_sentiment_model(model_name, backend)
+
+    textes = [texte or "" for texte in textes]
+    if not textes:
+        return
+
+    encodages = tokenizer(textes)["input_ids"]
+
+    courts = [index for index, tokens in enumerate(encodages) if len(tokens) <= max_length]
+    longs = [index for index, tokens in enumerate(encodages) if len(tokens) > max_length]
+
+    # Trier par longueur pour limiter le padding dans chaque lot
+    courts.sort(key=lambda index: len(encodages[index]))
+    for debut in range(0, len(courts), batch_size):
+        lot = courts[debut:debut + batch_size]
+        probs = _predire_probabilites(tokenizer, model, device, [encodages[index] for index in lot])
+        resultats = []
+        for index, ligne in zip(lot, probs):
+            label_id = int(np.argmax(ligne))
+            resultats.append((index, {
+                "label": model.config.id2label[label_id],
+                "score": float(ligne[label_id]),
+                "methode": "direct"
+            }))
+        yield resultats
+
+    for index in longs:
+        yield [(index, _analyse_fenetres(tokenizer, model, device, encodages[index], max_length, chevauchement, batch_size))]
+
+def analyse_sentiment_batch(textes, model_name=None, batch_size=None, max_length=None, chevauchement=128, backend=None):
+    """
+    Analyse le sentiment d'une liste de textes par lots (voir iter_sentiment_batches).
+
+    Args:
+        textes (list[str]): Textes à analyser.
+        model_name (str, optional): Nom du modèle. Defaults to config.SENTIMENT_MODEL_NAME.
+        batch_size (int, optional): Nombre de séquences par passe avant. Defaults to config.SENTIMENT_BATCH_SIZE.
+        max_length (int, optional): Longueur maximale (après padding) d'une séquence. Defaults to config.SENTIMENT_MAX_LENGTH.
+        chevauchement (int, optional): Chevauchement des fenêtres pour les textes longs. Defaults to 128.
+        backend (str, optional): Backend d'inférence. Defaults to config.SENTIMENT_BACKEND.
+
+    Returns:
+        list[dict]: Un résultat par texte, dans le même ordre, au même format que analyse_sentiment_long_texte.
+    """
+    resultats = [None] * len(textes)
+    for lot in iter_sentiment_batches(textes, model_name, batch_size, max_length, chevauchement, backend):
+        for index, resultat in lot:
+            resultats[index] = resultat
+    return resultats
+
+def analyse_sentiment_long_texte(texte, model_name=None, 
+                               taille_fenetre=384, chevauchement=128, backend=None):
     """
     Analyse un long texte en utilisant une fenêtre glissante
     """
-    # Charger le tokenizer et le modèle
-    tokenizer = AutoTokenizer.from_pretrained(model_name)
-    model = AutoModelForSequenceClassification.from_pretrained(model_name)
+    # Récupérer le tokenizer et le modèle déjà chargés
+    tokenizer, model, device = get_sentiment_model(model_name, backend)
     
     # Tokeniser le texte complet
     tokens = tokenizer.encode(texte)
     
     # Si le texte est plus court que la taille de fenêtre maximale
     if len(tokens) <= taille_fenetre:
-        inputs = tokenizer(texte, return_tensors="pt", truncation=True, max_length=taille_fenetre)
-        with torch.no_grad():
-            outputs = model(**inputs)
-        
-        probs = torch.nn.functional.softmax(outputs.logits, dim=-1)
-        label_id = torch.argmax(probs, dim=-1).item()
-        score = probs[0, label_id].item()
+        probs = _predire_probabilites(tokenizer, model, device, [tokens])
+        label_id = int(np.argmax(probs[0]))
+        score = float(probs[0, label_id])
         
         return {
             "label": model.config.id2label[label_id],
@@ -35,42 +272,68 @@ def analyse_sentiment_long_texte(texte, model_name="tabularisai/multilingual-sen
         }
     
     # Pour les textes plus longs, utiliser une fenêtre glissante
-    scores_segments = []
-    labels_segments = []
-    
-    # Créer des segments qui se chevauchent
-    for i in range(0, len(tokens) - 2, taille_fenetre - chevauchement):
-        # Extraire un segment de tokens
-        segment_tokens = tokens[i:i + taille_fenetre]
-        
-        # Convertir les tokens en texte
-        segment_text = tokenizer.decode(segment_tokens)
-        
-        # Tokeniser à nouveau pour obtenir les tenseurs d'entrée corrects
-        inputs = tokenizer(segment_text, return_tensors="pt", truncation=True)
-        
-        # Faire l'inférence
-        with torch.no_grad():
-            outputs = model(**inputs)
-        
-        # Obtenir les probabilités
-        probs = torch.nn.functional.softmax(outputs.logits, dim=-1)
-        
-        # Stocker les scores et labels pour chaque segment
-        for label_id in range(len(model.config.id2label)):
+    return _analyse_fenetres(tokenizer, model, device, tokens, taille_fenetre, chevauchement)
+
+def _fenetres_glissantes(tokenizer, tokens, taille_fenetre, chevauchement):
+    """
+    Découpe une séquence de tokens en fenêtres qui se chevauchent, directement au niveau des identifiants.
+
+    Args:
+        tokenizer: Tokenizer du modèle.
+        tokens (list[int]): Identifiants du texte complet, tels que renvoyés par le tokenizer (tokens spéciaux inclus).
+        taille_fenetre (int): Nombre maximal de tokens par fenêtre, tokens spéciaux inclus.
+        chevauchement (int): Nombre de tokens de contenu partagés entre deux fenêtres consécutives.
+
+    Returns:
+        list[list[int]]: Les fenêtres, chacune encadrée par les tokens spéciaux du modèle.
+    """
+    # Retirer seulement les tokens ajoutés par le tokenizer autour du texte ([CLS] ... [SEP]) :
+    # un masque des tokens spéciaux supprimerait aussi les [UNK] du contenu
+    avec = tokenizer.encode("a")
+    sans = tokenizer.encode("a", add_special_tokens=False)
+    avant = next(position for position in range(len(avec)) if avec[position:position + len(sans)] == sans)
+    apres = len(avec) - avant - len(sans)
+    prefixe, contenu, suffixe = tokens[:avant], tokens[avant:len(tokens) - apres], tokens[len(tokens) - apres:]
+
+    taille_contenu = taille_fenetre - avant - apres
+    pas = max(taille_contenu - chevauchement, 1)
+
+    fenetres = []
+    debut = 0
+    while True:
+        fenetres.append(prefixe + contenu[debut:debut + taille_contenu] + suffixe)
+        if debut + taille_contenu >= len(contenu):
+            break
+        debut += pas
+    return fenetres
+
+def _analyse_fenetres(tokenizer, model, device, tokens, taille_fenetre, chevauchement, batch_size=None):
+    """
+    Analyse un texte long en passant ses fenêtres au modèle par lots de batch_size,
+    puis en moyennant les probabilités de chaque label sur toutes les fenêtres.
+
+    Args:
+        tokenizer: Tokenizer du modèle.
+        model: Modèle de classification.
+        device (str): Device torch.
+        tokens (list[int]): Identifiants du texte complet, tokens spéciaux inclus.
+        taille_fenetre (int): Nombre maximal de tokens par fenêtre.
+        chevauchement (int): Chevauchement entre fenêtres.
+        batch_size (int, optional): Nombre de fenêtres par passe avant. Defaults to config.SENTIMENT_BATCH_SIZE.
+
+    Returns:
+        dict: Label final, score moyen et détail par label.
+    """
+    batch_size = batch_size or config.SENTIMENT_BATCH_SIZE
+    fenetres = _fenetres_glissantes(tokenizer, tokens, taille_fenetre, chevauchement)
+    probs = np.concatenate([
+        _predire_probabilites(tokenizer, model, device, fenetres[debut:debut + batch_size])
+        for debut in range(0, len(fenetres), batch_size)
+    ])
 
-            scores_segments.append(probs[0][label_id].item())
-            labels_segments.append(model.config.id2label[label_id])
-    
-    # Réorganiser les scores par label
-    label_scores = {}
-    for label, score in zip(labels_segments, scores_segments):
-        if label not in label_scores:
-            label_scores[label] = []
-        label_scores[label].append(score)
-    
     # Calculer la moyenne des scores pour chaque label
-    avg_scores = {label: np.mean(scores) for label, scores in label_scores.items()}
+    moyennes = probs.mean(axis=0)
+    avg_scores = {model.config.id2label[label_id]: float(moyennes[label_id]) for label_id in range(len(moyennes))}
     
     # Trouver le label avec le score moyen le plus élevé
     final_label = max(avg_scores.items(), key=lambda x: x[1])[0]
@@ -81,47 +344,187 @@ def analyse_sentiment_long_texte(texte, model_name="tabularisai/multilingual-sen
         "score": final_score,
         "methode": "fenetre_glissante",
         "details": {
-            "segments": len(tokens) // (taille_fenetre - chevauchement) + 1,
+            "segments": len(fenetres),
             "scores_par_label": avg_scores
         }
 
     }
     
-def get_message_for_thread(id: str, mongo_url: str, collec_name: str):
+def iter_sentiment_cached(ids, textes, model_name=None, backend=None, thread_ids=None, dates=None):
     """
-    Fonction qui récupère l'ensemble des messages dans la base de données et applique l'analyse de sentiments sur les messages
+    Analyse le sentiment d'une liste de messages en réutilisant les résultats stockés dans message_sentiment,
+    et renvoie les résultats au fur et à mesure.
+
+    Les résultats en base sont lus en une seule requête et renvoyés immédiatement ; seuls les messages
+    absents ou dont le contenu a changé (empreinte différente) passent par le modèle, et chaque lot
+    calculé est enregistré puis renvoyé dès qu'il est prêt. Les agrégats des threads concernés
+    sont mis à jour à la fin.
 
     Args:
-        id (str): identifiant du thread à analyser
+        ids (list[str]): Identifiants des messages.
+        textes (list[str]): Contenus des messages, dans le même ordre.
+        model_name (str, optional): Nom du modèle. Defaults to config.SENTIMENT_MODEL_NAME.
+        backend (str, optional): Backend d'inférence. Defaults to config.SENTIMENT_BACKEND.
+        thread_ids (list[str], optional): Thread de chaque message, pour les agrégats. Defaults to None.
+        dates (list[str], optional): Date de création de chaque message, pour les agrégats. Defaults to None.
+
+    Yields:
+        list[tuple]: Couples (index du message, résultat (label, score, methode)).
+    """
+    registry = SentimentModelRegistry.get_instance(model_name, backend=backend)
+    cache_key = registry.cache_key
+    empreintes = [hash_body(texte) for texte in textes]
+    thread_ids = thread_ids or [None] * len(textes)
+    dates = dates or [None] * len(textes)
+
+    conn = open_sentiment_store()
+    try:
+        cache = get_cached_sentiments(conn, [id for id in ids if id], cache_key) if conn else {}
+
+        trouves = []
+        a_calculer = []
+        for index, (id, empreinte) in enumerate(zip(ids, empreintes)):
+            entree = cache.get(id) if id else None
+            if entree and entree[0] == empreinte:
+                trouves.append((index, {"label": entree[1], "score": entree[2], "methode": "cache"}))
+            else:
+                a_calculer.append(index)
+        SentimentCacheStats.get_instance().record(len(trouves), len(a_calculer))
+        if trouves:
+            yield trouves
+
+        if a_calculer:
+            lots = iter_sentiment_batches([textes[index] for index in a_calculer], model_name=registry.model_name, backend=registry.backend)
+            for lot in lots:
+                lot = [(a_calculer[position], resultat) for position, resultat in lot]
+                if conn:
+                    save_sentiments(conn, [
+                        (ids[index], empreintes[index], resultat["label"], resultat["score"], thread_ids[index], dates[index])
+                        for index, resultat in lot if ids[index]
+                    ], cache_key)
+                yield lot
+            if conn:
+                refresh_aggregates(conn, [thread_ids[index] for index in a_calculer], cache_key)
+    finally:
+        if conn:
+            conn.close()
+
+def analyse_sentiment_cached(ids, textes, model_name=None, backend=None, thread_ids=None, dates=None):
+    """
+    Analyse le sentiment d'une liste de messages en passant par le cache message_sentiment (voir iter_sentiment_cached).
+
+    Args:
+        ids (list[str]): Identifiants des messages.
+        textes (list[str]): Contenus des messages, dans le même ordre.
+        model_name (str, optional): Nom du modèle. Defaults to config.SENTIMENT_MODEL_NAME.
+        backend (str, optional): Backend d'inférence. Defaults to config.SENTIMENT_BACKEND.
+        thread_ids (list[str], optional): Thread de chaque message, pour les agrégats. Defaults to None.
+        dates (list[str], optional): Date de création de chaque message, pour les agrégats. Defaults to None.
+
+    Returns:
+        list[dict]: Un résultat (label, score, methode) par message, dans le même ordre.
+    """
+    resultats = [None] * len(textes)
+    for lot in iter_sentiment_cached(ids, textes, model_name, backend, thread_ids, dates):
+        for index, resultat in lot:
+            resultats[index] = resultat
+    return resultats
+
+def _message_id(message):
+    """Retourne l'identifiant d'un message, qu'il s'agisse d'un thread ou d'une réponse."""
+    return message.get("id") or message.get("_id") or message.get("content", {}).get("id")
+
+def get_thread_messages(id: str, mongo_url: str, collec_name: str):
+    """
+    Récupère un thread et toutes ses réponses, à n'importe quelle profondeur, sous forme de liste à plat.
+
+    Args:
+        id (str): identifiant du thread
+        mongo_url (str): URL de connexion à MongoDB
+        collec_name (str): nom de la base MongoDB
+
+    Returns:
+        list[tuple]: (message sans ses réponses, profondeur, identifiant du parent), dans l'ordre du fil.
     """
     client = MongoClient(mongo_url)
     messages = client[collec_name]["threads"].find({"_id": id})
     messages_list = []
 
     for message in messages:
-        message_data = {key: value for key, value in message.items() if key != "content"}
-        message_data["content"] = {key: value for key, value in message["content"].items() if key != "children"}
-        messages_list.append(message_data)
+        for node, depth, parent_id in iter_thread_messages(message["content"]):
+            if depth == 0:
+                node = {key: value for key, value in message.items() if key != "content"}
+                node["content"] = message_fields(message["content"])
+            else:
+                node = message_fields(node)
+            messages_list.append((node, depth, parent_id))
 
-        if "children" in message["content"]:
-            for child in message["content"]["children"]:
-                messages_list.append(child)
+    return messages_list
+
+def _message_body(message):
+    """Retourne le contenu d'un message, qu'il s'agisse d'un thread ou d'une réponse."""
+    return message["body"] if "body" in message else message.get("content", {}).get("body", "")
+
+def _message_date(message):
+    """Retourne la date de création d'un message, qu'il s'agisse d'un thread ou d'une réponse."""
+    return message.get("created_at") or message.get("content", {}).get("created_at")
+
+def get_message_for_thread(id: str, mongo_url: str, collec_name: str):
+    """
+    Fonction qui récupère l'ensemble des messages dans la base de données et applique l'analyse de sentiments sur les messages
+
+    Args:
+        id (str): identifiant du thread à analyser
+    """
+    messages_list = get_thread_messages(id, mongo_url, collec_name)
 
     print(f"Nombre de messages : {len(messages_list)}")
     result_list = []
-    print(messages_list)
 
-    for message in messages_list:
-        body = message["body"] if "body" in message else message.get("content", {}).get("body", "")
-        result = analyse_sentiment_long_texte(body)
+    bodies = [_message_body(message) for message, _, _ in messages_list]
+    results = analyse_sentiment_cached([_message_id(message) for message, _, _ in messages_list], bodies,
+                                       thread_ids=[id] * len(messages_list),
+                                       dates=[_message_date(message) for message, _, _ in messages_list])
 
+    for (message, depth, parent_id), result in zip(messages_list, results):
         result_list.append({
             "message": message,
+            "depth": depth,
+            "parent_id": parent_id,
             "label": result["label"],
             "score": result["score"]
         })
 
     return result_list
+
+def iter_message_for_thread(id: str, mongo_url: str, collec_name: str):
+    """
+    Variante de get_message_for_thread qui renvoie le sentiment de chaque message dès que son lot est calculé.
+
+    Args:
+        id (str): identifiant du thread à analyser
+        mongo_url (str): URL de connexion à MongoDB
+        collec_name (str): nom de la base MongoDB
+
+    Yields:
+        dict: {"index", "message", "depth", "parent_id", "label", "score"} pour chaque message, dans l'ordre de calcul.
+    """
+    messages_list = get_thread_messages(id, mongo_url, collec_name)
+    bodies = [_message_body(message) for message, _, _ in messages_list]
+    lots = iter_sentiment_cached([_message_id(message) for message, _, _ in messages_list], bodies,
+                                 thread_ids=[id] * len(messages_list),
+                                 dates=[_message_date(message) for message, _, _ in messages_list])
+    for lot in lots:
+        for index, result in lot:
+            message, depth, parent_id = messages_list[index]
+            yield {
+                "index": index,
+                "message": message,
+                "depth": depth,
+                "parent_id": parent_id,
+                "label": result["label"],
+                "score": result["score"]
+            }
     
 if __name__ == "__main__":
     id = "52ef4f99344caaf903000158"
@@ -0,0 +1,191 @@
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+
+def create_aggregate_tables(conn):
+    """
+    Crée les tables d'agrégats de sentiment par thread et par cours/semaine si elles n'existent pas.
+
+    Args:
+        conn: Connexion à la base de données.
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS thread_sentiment_stats (
+            thread_id TEXT NOT NULL,
+            model_name TEXT NOT NULL,
+            label TEXT NOT NULL,
+            nb_messages INTEGER NOT NULL,
+            mean_score FLOAT NOT NULL,
+            updated_at TIMESTAMP NOT NULL DEFAULT now(),
+            PRIMARY KEY (thread_id, model_name, label)
+        )
+        """)
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS course_sentiment_weekly (
+            course_id TEXT NOT NULL,
+            week DATE NOT NULL,
+            model_name TEXT NOT NULL,
+            label TEXT NOT NULL,
+            nb_messages INTEGER NOT NULL,
+            mean_score FLOAT NOT NULL,
+            updated_at TIMESTAMP NOT NULL DEFAULT now(),
+            PRIMARY KEY (course_id, week, model_name, label)
+        )
+        """)
+    conn.commit()
+
+def refresh_aggregates(conn, thread_ids, model_name):
+    """
+    Recalcule les agrégats des threads donnés et des semaines de cours auxquelles ils contribuent.
+
+    Seules les lignes touchées sont supprimées puis recalculées depuis message_sentiment, ce qui
+    permet d'appeler cette fonction après chaque lot de messages scorés.
+
+    Args:
+        conn: Connexion à la base de données.
+        thread_ids (list[str]): Threads dont des messages viennent d'être scorés.
+        model_name (str): Clé du modèle dans message_sentiment.
+    """
+    thread_ids = list({thread_id for thread_id in thread_ids if thread_id})
+    if not thread_ids:
+        return
+    try:
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM thread_sentiment_stats WHERE model_name = %s AND thread_id = ANY(%s)", (model_name, thread_ids))
+            cur.execute("""
+                INSERT INTO thread_sentiment_stats (thread_id, model_name, label, nb_messages, mean_score)
+                SELECT thread_id, model_name, label, count(*), avg(score)
+                FROM message_sentiment
+                WHERE model_name = %s AND thread_id = ANY(%s)
+                GROUP BY thread_id, model_name, label
+                """, (model_name, thread_ids))
+
+            # Semaines de cours concernées par ces threads
+            cur.execute("""
+                SELECT DISTINCT t.course_id::text, date_trunc('week', ms.created_at)::date
+                FROM message_sentiment ms
+                JOIN threads t ON t.id = ms.thread_id
+                WHERE ms.model_name = %s AND ms.thread_id = ANY(%s) AND ms.created_at IS NOT NULL
+                """, (model_name, thread_ids))
+            touched = cur.fetchall()
+            if touched:
+                course_ids = [row[0] for row in touched]
+                weeks = [row[1] for row in touched]
+                cur.execute("""
+                    DELETE FROM course_sentiment_weekly w
+                    USING unnest(%s::text[], %s::date[]) AS touched(course_id, week)
+                    WHERE w.model_name = %s AND w.course_id = touched.course_id AND w.week = touched.week
+                    """, (course_ids, weeks, model_name))
+                cur.execute("""
+                    INSERT INTO course_sentiment_weekly (course_id, week, model_name, label, nb_messages, mean_score)
+                    SELECT t.course_id::text, date_trunc('week', ms.created_at)::date AS week, ms.model_name, ms.label, count(*), avg(ms.score)
+                    FROM message_sentiment ms
+                    JOIN threads t ON t.id = ms.thread_id
+                    JOIN unnest(%s::text[], %s::date[]) AS touched(course_id, week)
+                        ON touched.course_id = t.course_id::text AND touched.week = date_trunc('week', ms.created_at)::date
+                    WHERE ms.model_name = %s
+                    GROUP BY t.course_id, week, ms.model_name, ms.label
+                    """, (course_ids, weeks, model_name))
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"Error refreshing sentiment aggregates: {e}")
+
+def rebuild_aggregates(conn, model_name):
+    """
+    Reconstruit entièrement les agrégats d'un modèle à partir de message_sentiment.
+
+    Args:
+        conn: Connexion à la base de données.
+        model_name (str): Clé du modèle dans message_sentiment.
+    """
+    create_aggregate_tables(conn)
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM thread_sentiment_stats WHERE model_name = %s", (model_name,))
+        cur.execute("DELETE FROM course_sentiment_weekly WHERE model_name = %s", (model_name,))
+        cur.execute("""
+            INSERT INTO thread_sentiment_stats (thread_id, model_name, label, nb_messages, mean_score)
+            SELECT thread_id, model_name, label, count(*), avg(score)
+            FROM message_sentiment
+            WHERE model_name = %s AND thread_id IS NOT NULL
+            GROUP BY thread_id, model_name, label
+            """, (model_name,))
+        cur.execute("""
+            INSERT INTO course_sentiment_weekly (course_id, week, model_name, label, nb_messages, mean_score)
+            SELECT t.course_id::text, date_trunc('week', ms.created_at)::date AS week, ms.model_name, ms.label, count(*), avg(ms.score)
+            FROM message_sentiment ms
+            JOIN threads t ON t.id = ms.thread_id
+            WHERE ms.model_name = %s AND ms.created_at IS NOT NULL
+            GROUP BY t.course_id, week, ms.model_name, ms.label
+            """, (model_name,))
+    conn.commit()
+
+def get_thread_sentiment_stats(conn, thread_id, model_name):
+    """
+    Retourne la répartition des labels d'un thread.
+
+    Args:
+        conn: Connexion à la base de données.
+        thread_id (str): Identifiant du thread.
+        model_name (str): Clé du modèle dans message_sentiment.
+
+    Returns:
+        list[dict]: Une entrée par label avec le nombre de messages et le score moyen.
+    """
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT label, nb_messages, mean_score
+                FROM thread_sentiment_stats
+                WHERE thread_id = %s AND model_name = %s
+                ORDER BY nb_messages DESC
+                """, (thread_id, model_name))
+            return [{"label": row[0], "nb_messages": row[1], "mean_score": row[2]} for row in cur.fetchall()]
+    except Exception as e:
+        conn.rollback()
+        print(f"Error getting thread sentiment stats: {e}")
+        return []
+
+def get_course_sentiment_weekly(conn, course_name, model_name):
+    """
+    Retourne l'évolution hebdomadaire des labels d'un cours.
+
+    Args:
+        conn: Connexion à la base de données.
+        course_name (str): Nom du cours.
+        model_name (str): Clé du modèle dans message_sentiment.
+
+    Returns:
+        list[dict]: Une entrée par semaine et par label avec le nombre de messages et le score moyen.
+    """
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT w.week, w.label, w.nb_messages, w.mean_score
+                FROM course_sentiment_weekly w
+                JOIN courses c ON c.id::text = w.course_id
+                WHERE c.name = %s AND w.model_name = %s
+                ORDER BY w.week, w.label
+                """, (course_name, model_name))
+            return [
+                {"week": row[0].isoformat(), "label": row[1], "nb_messages": row[2], "mean_score": row[3]}
+                for row in cur.fetchall()
+            ]
+    except Exception as e:
+        conn.rollback()
+        print(f"Error getting course sentiment stats: {e}")
+        return []
+
+if __name__ == "__main__":
+    from api import config
+    from api.services.database_helper import connect_to_db
+    conn = connect_to_db()
+    if conn:
+        from api.services.sentiment_store import sentiment_model_key
+        rebuild_aggregates(conn, sentiment_model_key(config.SENTIMENT_MODEL_NAME, config.SENTIMENT_BACKEND))
+        print("Agrégats de sentiment reconstruits.")
+        conn.close()
+    else:
+        print("Failed to connect to the database.")
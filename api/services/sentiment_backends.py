@@ -0,0 +1,146 @@
+import os
+import sys
+from types import SimpleNamespace
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from api import config
+
+BACKENDS = ("torch", "torch_int8", "onnx")
+
+
+class OnnxSentimentModel:
+    """Session ONNX Runtime qui s'utilise comme un modèle transformers : model(**inputs).logits."""
+
+    def __init__(self, session, model_config):
+        self.session = session
+        self.config = model_config
+        self.input_names = {entry.name for entry in session.get_inputs()}
+
+    def __call__(self, **inputs):
+        feed = {name: tensor.cpu().numpy() for name, tensor in inputs.items() if name in self.input_names}
+        logits = self.session.run(["logits"], feed)[0]
+        import torch
+        return SimpleNamespace(logits=torch.from_numpy(logits))
+
+    def to(self, device):
+        return self
+
+    def eval(self):
+        return self
+
+
+def artifacts_dir(model_name, backend, root=None):
+    """
+    Retourne le dossier où sont stockés les artefacts exportés d'un modèle.
+
+    Args:
+        model_name (str): Nom du modèle Hugging Face.
+        backend (str): Nom du backend ("torch_int8" ou "onnx").
+        root (str, optional): Dossier racine. Defaults to config.SENTIMENT_ARTIFACTS_DIR.
+
+    Returns:
+        str: Chemin du dossier.
+    """
+    root = root or config.SENTIMENT_ARTIFACTS_DIR
+    return os.path.join(root, model_name.replace("/", "__"), backend)
+
+def _quantize(model):
+    import torch
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+def export_artifacts(model_name, backend, tokenizer, root=None):
+    """
+    Exporte une fois pour toutes le modèle au format du backend demandé.
+
+    Args:
+        model_name (str): Nom du modèle Hugging Face.
+        backend (str): "torch_int8" (quantification dynamique int8) ou "onnx".
+        tokenizer: Tokenizer du modèle, utilisé pour générer l'entrée d'exemple de l'export ONNX.
+        root (str, optional): Dossier racine des artefacts. Defaults to config.SENTIMENT_ARTIFACTS_DIR.
+
+    Returns:
+        str: Chemin du fichier exporté.
+    """
+    import torch
+    from transformers import AutoModelForSequenceClassification # type: ignore
+    directory = artifacts_dir(model_name, backend, root)
+    os.makedirs(directory, exist_ok=True)
+    model = AutoModelForSequenceClassification.from_pretrained(model_name)
+    model.eval()
+
+    if backend == "torch_int8":
+        path = os.path.join(directory, "model.pt")
+        torch.save(_quantize(model), path)
+    elif backend == "onnx":
+        path = os.path.join(directory, "model.onnx")
+        sample = tokenizer(["Bonjour à tous", "Merci"], padding=True, return_tensors="pt")
+        torch.onnx.export(
+            model,
+            (sample["input_ids"], sample["attention_mask"]),
+            path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["logits"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "logits": {0: "batch"},
+            },
+            opset_version=14,
+        )
+    else:
+        raise ValueError(f"Backend sans export : {backend}")
+
+    model.config.save_pretrained(directory)
+    return path
+
+def load_backend(model_name, backend, device, root=None):
+    """
+    Charge le modèle de sentiment pour le backend demandé.
+
+    Les backends "torch_int8" et "onnx" utilisent les artefacts créés par export_artifacts ;
+    sans artefact, "torch_int8" quantifie le modèle à la volée et "onnx" lève une erreur.
+
+    Args:
+        model_name (str): Nom du modèle Hugging Face.
+        backend (str): "torch", "torch_int8" ou "onnx".
+        device (str): Device torch. Les backends quantifiés tournent sur CPU.
+        root (str, optional): Dossier racine des artefacts. Defaults to config.SENTIMENT_ARTIFACTS_DIR.
+
+    Returns:
+        tuple: (modèle, taille des poids en octets)
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend de sentiment inconnu : {backend} (attendu : {', '.join(BACKENDS)})")
+
+    directory = artifacts_dir(model_name, backend, root)
+    # Imports différés : torch et transformers ne sont chargés qu'au chargement du modèle
+    import torch
+    from transformers import AutoModelForSequenceClassification # type: ignore
+
+    if backend == "torch":
+        model = AutoModelForSequenceClassification.from_pretrained(model_name)
+        model.to(device)
+        model.eval()
+        memory = sum(p.numel() * p.element_size() for p in model.parameters()) \
+            + sum(b.numel() * b.element_size() for b in model.buffers())
+        return model, memory
+
+    if backend == "torch_int8":
+        path = os.path.join(directory, "model.pt")
+        if os.path.exists(path):
+            model = torch.load(path, weights_only=False)
+            memory = os.path.getsize(path)
+        else:
+            print(f"Aucun artefact int8 dans {directory}, quantification à la volée.")
+            model = _quantize(AutoModelForSequenceClassification.from_pretrained(model_name))
+            memory = None
+        model.eval()
+        return model, memory
+
+    import onnxruntime # type: ignore
+    from transformers import AutoConfig # type: ignore
+    path = os.path.join(directory, "model.onnx")
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Modèle ONNX introuvable : {path}. Lancer scripts/export_sentiment_model.py export --backend onnx")
+    providers = ["CUDAExecutionProvider", "CPUExecutionProvider"] if device.startswith("cuda") else ["CPUExecutionProvider"]
+    session = onnxruntime.InferenceSession(path, providers=providers)
+    return OnnxSentimentModel(session, AutoConfig.from_pretrained(directory)), os.path.getsize(path)
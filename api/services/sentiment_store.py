@@ -0,0 +1,179 @@
+import os
+import sys
+import threading
+from psycopg2.extras import execute_values
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from api.services.sentiment_aggregates import create_aggregate_tables
+from api.services.embedding_store import hash_body
+
+
+class SentimentCacheStats:
+    """Compteurs de succès/échecs du cache de sentiment, partagés par le processus."""
+    _instance = None
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = SentimentCacheStats()
+        return cls._instance
+
+    def record(self, hits, misses):
+        """Ajoute le résultat d'une recherche groupée dans le cache."""
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def to_dict(self):
+        """Retourne les compteurs sous forme de dictionnaire."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else None
+        }
+
+
+def sentiment_model_key(model_name, backend="torch"):
+    """
+    Retourne le nom sous lequel les résultats d'un modèle sont stockés dans message_sentiment.
+
+    Args:
+        model_name (str): Nom du modèle Hugging Face.
+        backend (str, optional): Backend d'inférence. Defaults to "torch".
+
+    Returns:
+        str: Le nom du modèle, suffixé par le backend s'il ne s'agit pas du modèle torch d'origine.
+    """
+    return model_name if backend == "torch" else f"{model_name}:{backend}"
+
+def create_sentiment_table(conn):
+    """
+    Crée la table message_sentiment si elle n'existe pas.
+
+    Args:
+        conn: Connexion à la base de données.
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS message_sentiment (
+            id TEXT NOT NULL,
+            model_name TEXT NOT NULL,
+            body_hash TEXT NOT NULL,
+            label TEXT NOT NULL,
+            score FLOAT NOT NULL,
+            thread_id TEXT,
+            created_at TIMESTAMPTZ,
+            computed_at TIMESTAMP NOT NULL DEFAULT now(),
+            PRIMARY KEY (id, model_name)
+        )
+        """)
+        # Tables créées avant l'ajout des agrégats
+        cur.execute("ALTER TABLE message_sentiment ADD COLUMN IF NOT EXISTS thread_id TEXT")
+        cur.execute("ALTER TABLE message_sentiment ADD COLUMN IF NOT EXISTS created_at TIMESTAMPTZ")
+        cur.execute("CREATE INDEX IF NOT EXISTS message_sentiment_thread_idx ON message_sentiment (model_name, thread_id)")
+    conn.commit()
+
+def get_cached_sentiments(conn, ids, model_name):
+    """
+    Récupère en une seule requête les sentiments déjà calculés pour une liste de messages.
+
+    Args:
+        conn: Connexion à la base de données.
+        ids (list[str]): Identifiants des messages.
+        model_name (str): Nom du modèle de sentiment.
+
+    Returns:
+        dict: {id: (body_hash, label, score)} pour les messages présents en base.
+    """
+    if not ids:
+        return {}
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT id, body_hash, label, score FROM message_sentiment WHERE model_name = %s AND id = ANY(%s)",
+                (model_name, list(ids))
+            )
+            return {row[0]: (row[1], row[2], row[3]) for row in cur.fetchall()}
+    except Exception as e:
+        conn.rollback()
+        print(f"Error fetching cached sentiments: {e}")
+        return {}
+
+def save_sentiments(conn, rows, model_name):
+    """
+    Enregistre (ou met à jour) les sentiments calculés.
+
+    Args:
+        conn: Connexion à la base de données.
+        rows (list[tuple]): Tuples (id, body_hash, label, score, thread_id, created_at).
+        model_name (str): Nom du modèle de sentiment.
+    """
+    if not rows:
+        return
+    try:
+        with conn.cursor() as cur:
+            execute_values(cur, """
+                INSERT INTO message_sentiment (id, model_name, body_hash, label, score, thread_id, created_at)
+                VALUES %s
+                ON CONFLICT (id, model_name) DO UPDATE SET
+                    body_hash = EXCLUDED.body_hash,
+                    label = EXCLUDED.label,
+                    score = EXCLUDED.score,
+                    thread_id = COALESCE(EXCLUDED.thread_id, message_sentiment.thread_id),
+                    created_at = COALESCE(EXCLUDED.created_at, message_sentiment.created_at),
+                    computed_at = now()
+                """,
+                [(id, model_name, body_hash, label, float(score), thread_id, created_at)
+                 for id, body_hash, label, score, thread_id, created_at in rows]
+            )
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"Error saving sentiments: {e}")
+
+def get_cache_stats():
+    """
+    Retourne les compteurs du cache de sentiment.
+
+    Returns:
+        dict: Nombre de succès, d'échecs et taux de succès.
+    """
+    return SentimentCacheStats.get_instance().to_dict()
+
+_table_ready = False
+
+def open_sentiment_store():
+    """
+    Ouvre une connexion PostgreSQL et s'assure (une fois par processus) que la table message_sentiment
+    et les tables d'agrégats existent.
+
+    Le cache est optionnel : sans variables DB_* configurées, l'analyse tourne sans lui.
+
+    Returns:
+        conn: Connexion à la base de données, ou None si la base n'est pas configurée ou si la connexion échoue.
+    """
+    global _table_ready
+    try:
+        # Import différé : database_helper lève une ValueError à l'import si les variables DB_* manquent
+        from api.services.database_helper import connect_to_db
+    except ValueError as e:
+        print(f"Cache de sentiment désactivé : {e}")
+        return None
+    conn = connect_to_db()
+    if conn is None:
+        return None
+    if not _table_ready:
+        try:
+            create_sentiment_table(conn)
+            create_aggregate_tables(conn)
+            _table_ready = True
+        except Exception as e:
+            print(f"Error creating message_sentiment table: {e}")
+            conn.close()
+            return None
+    return conn
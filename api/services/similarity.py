@@ -0,0 +1,56 @@
+import struct
+
+
+class SimilarDocument:
+    """
+    Résultat d'une recherche de similarité : un document et son score, sans son vecteur par défaut.
+    """
+    __slots__ = ("id", "score", "course", "thread_id", "vector")
+
+    def __init__(self, id, score, course=None, thread_id=None, vector=None):
+        """
+        Args:
+            id (str): Identifiant du document (thread ou message).
+            score (float): Similarité cosinus avec la question.
+            course (str, optional): Nom du cours du document. Defaults to None.
+            thread_id (str, optional): Thread du document (son propre id pour un thread). Defaults to None.
+            vector (numpy.ndarray, optional): Vecteur float32, seulement s'il a été demandé. Defaults to None.
+        """
+        self.id = id
+        self.score = score
+        self.course = course
+        self.thread_id = thread_id
+        self.vector = vector
+
+    def to_dict(self):
+        """Retourne le résultat sous forme de dictionnaire sérialisable en JSON (sans le vecteur)."""
+        return {
+            "id": self.id,
+            "score": self.score,
+            "course": self.course,
+            "thread_id": self.thread_id,
+        }
+
+    def __repr__(self):
+        return f"SimilarDocument(id={self.id!r}, score={self.score:.4f}, course={self.course!r}, thread_id={self.thread_id!r})"
+
+
+def parse_vector_send(value):
+    """
+    Convertit la forme binaire d'un vecteur pgvector (résultat de vector_send) en tableau NumPy float32.
+
+    Le format binaire est : dimension (int16), champ inutilisé (int16), puis les composantes en float4 big-endian ;
+    il évite à PostgreSQL d'écrire et à Python de relire 384 nombres en texte.
+
+    Args:
+        value (memoryview | bytes): Valeur bytea renvoyée par psycopg2.
+
+    Returns:
+        numpy.ndarray: Le vecteur, ou None si la valeur est NULL.
+    """
+    if value is None:
+        return None
+    import numpy as np
+    buffer = bytes(value)
+    dim, _ = struct.unpack_from(">hh", buffer)
+    return np.frombuffer(buffer, dtype=">f4", count=dim, offset=4).astype(np.float32)
@@ -0,0 +1,49 @@
+# "endorsed_reponses" / "non_endorsed_reponses" : orthographe rencontrée dans une partie des exports
+CHILD_KEYS = ("children", "endorsed_responses", "endorsed_reponses", "non_endorsed_responses", "non_endorsed_reponses")
+
+
+def _unwrap(node):
+    """Certains exports encapsulent le message dans une clé 'content' : renvoie le message lui-même."""
+    content = node.get("content")
+    if isinstance(content, dict) and "body" not in node:
+        return content
+    return node
+
+def iter_thread_messages(root, parent_id=None):
+    """
+    Parcourt un thread et toutes ses réponses (children, endorsed_responses, non_endorsed_responses),
+    à n'importe quelle profondeur, sans récursion.
+
+    Les messages sont renvoyés dans l'ordre du fil (parcours en profondeur, réponses dans l'ordre
+    d'origine) et ne sont pas copiés : utiliser message_fields pour obtenir un message sans ses réponses.
+
+    Args:
+        root (dict): Thread (document de la collection threads ou son champ 'content') ou message.
+        parent_id (str, optional): Identifiant du parent de root. Defaults to None.
+
+    Yields:
+        tuple: (message, profondeur, identifiant du parent), la racine ayant la profondeur 0.
+    """
+    stack = [(root, 0, parent_id)]
+    while stack:
+        node, depth, parent = stack.pop()
+        node = _unwrap(node)
+        yield node, depth, parent
+
+        node_id = node.get("id") or node.get("_id")
+        # Empiler à l'envers pour ressortir les réponses dans l'ordre d'origine
+        for key in reversed(CHILD_KEYS):
+            for child in reversed(node.get(key) or []):
+                stack.append((child, depth + 1, node_id))
+
+def message_fields(message):
+    """
+    Retourne une copie superficielle du message sans ses réponses.
+
+    Args:
+        message (dict): Message d'un thread.
+
+    Returns:
+        dict: Les champs du message, hors listes de réponses.
+    """
+    return {key: value for key, value in message.items() if key not in CHILD_KEYS}
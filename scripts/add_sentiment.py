@@ -0,0 +1,196 @@
+import os
+import sys
+import json
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+#MongoDB
+from pymongo import MongoClient
+
+#Environnement
+from dotenv import load_dotenv
+
+#Barre de progression
+from tqdm import tqdm
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from api.services.sentiment import analyse_sentiment_batch, SentimentModelRegistry
+from api.services.sentiment_store import hash_body, open_sentiment_store, save_sentiments
+from api.services.sentiment_aggregates import refresh_aggregates
+from api.services.mongo_helper import modified_since_filter
+
+load_dotenv()
+
+CHECKPOINT_PATH = "data/sentiment_checkpoint.json"
+
+
+def load_checkpoint(path=CHECKPOINT_PATH):
+    """
+    Charge le point de reprise du dernier traitement.
+
+    Args:
+        path (str, optional): Chemin du fichier de reprise. Defaults to CHECKPOINT_PATH.
+
+    Returns:
+        dict: {"last_id": ..., "processed": ...} ou un point de départ vide.
+    """
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {"last_id": None, "processed": 0}
+
+def save_checkpoint(last_id, processed, path=CHECKPOINT_PATH):
+    """
+    Enregistre le point de reprise (écriture atomique).
+
+    Args:
+        last_id (str): Dernier _id dont le résultat est enregistré en base.
+        processed (int): Nombre total de documents traités.
+        path (str, optional): Chemin du fichier de reprise. Defaults to CHECKPOINT_PATH.
+    """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"last_id": last_id, "processed": processed}, f)
+    os.replace(tmp_path, path)
+
+def since_checkpoint_path(checkpoint_path, since):
+    """
+    Retourne le fichier de reprise d'un passage --since, distinct de celui du traitement complet.
+
+    Un passage --since ne parcourt que les documents modifiés : partager le point de reprise ferait
+    sauter au traitement complet les documents non encore traités situés entre deux documents modifiés.
+
+    Args:
+        checkpoint_path (str): Chemin du fichier de reprise du traitement complet.
+        since (str): Date ISO du passage.
+
+    Returns:
+        str: Chemin du fichier de reprise propre à cette date.
+    """
+    root, ext = os.path.splitext(checkpoint_path)
+    return f"{root}_since_{''.join(ch if ch.isalnum() else '-' for ch in since)}{ext}"
+
+def iter_document_batches(client, batch_size, last_id=None, since=None, limit=None):
+    """
+    Parcourt la collection G1.documents par ordre de _id, par lots.
+
+    Args:
+        client (MongoClient): Client MongoDB.
+        batch_size (int): Nombre de documents par lot.
+        last_id (str, optional): Reprendre après ce _id. Defaults to None.
+        since (str, optional): Date ISO ; seuls les documents modifiés depuis sont traités. Defaults to None.
+        limit (int, optional): Nombre maximal de documents. Defaults to None.
+
+    Yields:
+        list[dict]: Lots de documents (_id, body, thread_id, created_at).
+    """
+    filter = {}
+    if last_id is not None:
+        filter["_id"] = {"$gt": last_id}
+    if since:
+        filter.update(modified_since_filter(since))
+
+    cursor = client['G1']['documents'].find(filter, {"_id": 1, "body": 1, "thread_id": 1, "created_at": 1}).sort("_id", 1).batch_size(batch_size)
+    if limit:
+        cursor = cursor.limit(limit)
+
+    batch = []
+    for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def score_batch(batch, registry):
+    """
+    Calcule le sentiment d'un lot de documents.
+
+    Args:
+        batch (list[dict]): Documents du lot.
+        registry (SentimentModelRegistry): Modèle de sentiment à utiliser.
+
+    Returns:
+        list[tuple]: Tuples (id, body_hash, label, score, thread_id, created_at) prêts à être enregistrés.
+    """
+    bodies = [doc.get("body") or "" for doc in batch]
+    results = analyse_sentiment_batch(bodies, model_name=registry.model_name, backend=registry.backend)
+    return [
+        (doc["_id"], hash_body(body), result["label"], result["score"], doc.get("thread_id") or doc["_id"], doc.get("created_at"))
+        for doc, body, result in zip(batch, bodies, results)
+    ]
+
+def add_sentiment(batch_size=256, workers=2, limit=None, since=None, resume=True, checkpoint_path=CHECKPOINT_PATH):
+    """
+    Calcule et enregistre le sentiment de tous les documents de G1.documents.
+
+    Les lots sont scorés en parallèle par un pool de workers, puis écrits en base dans l'ordre
+    des _id : le point de reprise ne dépasse donc jamais un lot non enregistré.
+
+    Args:
+        batch_size (int, optional): Nombre de documents par lot. Defaults to 256.
+        workers (int, optional): Nombre de lots scorés en parallèle. Defaults to 2.
+        limit (int, optional): Nombre maximal de documents à traiter. Defaults to None.
+        since (str, optional): Date ISO ; ne traite que les documents créés ou modifiés depuis. Defaults to None.
+        resume (bool, optional): Reprendre depuis le dernier point de reprise. Defaults to True.
+        checkpoint_path (str, optional): Chemin du fichier de reprise. Defaults to CHECKPOINT_PATH.
+            Avec since, le point de reprise est enregistré dans un fichier propre à la date (voir since_checkpoint_path).
+    """
+    registry = SentimentModelRegistry.get_instance()
+    client = MongoClient(os.getenv("MONGO_URL"))
+    conn = open_sentiment_store()
+    if conn is None:
+        print("Impossible de se connecter à PostgreSQL.")
+        return
+
+    if since:
+        checkpoint_path = since_checkpoint_path(checkpoint_path, since)
+    checkpoint = load_checkpoint(checkpoint_path) if resume else {"last_id": None, "processed": 0}
+    last_id = checkpoint["last_id"]
+    processed = checkpoint["processed"]
+    if last_id is not None:
+        print(f"Reprise après le document {last_id} ({processed} documents déjà traités)")
+
+    start = time.time()
+    done = 0
+    pending = deque()
+
+    def flush(future, batch):
+        nonlocal last_id, processed, done
+        rows = future.result()
+        save_sentiments(conn, rows, registry.cache_key)
+        refresh_aggregates(conn, [row[4] for row in rows], registry.cache_key)
+        last_id = batch[-1]["_id"]
+        processed += len(batch)
+        done += len(batch)
+        save_checkpoint(last_id, processed, checkpoint_path)
+        pbar.update(len(batch))
+        pbar.set_postfix(docs_s=f"{done / (time.time() - start):.1f}")
+
+    with ThreadPoolExecutor(max_workers=workers) as executor, tqdm(total=limit, desc="Analyse de sentiment") as pbar:
+        for batch in iter_document_batches(client, batch_size, last_id=last_id, since=since, limit=limit):
+            pending.append((executor.submit(score_batch, batch, registry), batch))
+            # Limiter le nombre de lots en mémoire
+            while len(pending) >= workers * 2:
+                flush(*pending.popleft())
+        while pending:
+            flush(*pending.popleft())
+
+    conn.close()
+    elapsed = time.time() - start
+    print(f"Traitement terminé: {done} documents en {elapsed:.1f} secondes ({done / elapsed if elapsed else 0:.1f} docs/s)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calcule le sentiment de tous les documents de G1.documents.")
+    parser.add_argument("--batch-size", type=int, default=256, help="Nombre de documents par lot")
+    parser.add_argument("--workers", type=int, default=2, help="Nombre de lots scorés en parallèle")
+    parser.add_argument("--limit", type=int, default=None, help="Nombre maximal de documents à traiter")
+    parser.add_argument("--since", default=None, help="Date ISO (ex: 2024-01-01) : ne traite que les documents créés ou modifiés depuis")
+    parser.add_argument("--no-resume", action="store_true", help="Ignore le point de reprise et repart du début")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH, help="Chemin du fichier de reprise")
+    args = parser.parse_args()
+    add_sentiment(batch_size=args.batch_size, workers=args.workers, limit=args.limit, since=args.since,
+                  resume=not args.no_resume, checkpoint_path=args.checkpoint)
@@ -0,0 +1,149 @@
+import os
+import sys
+import time
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from api.services.database_helper import connect_to_db, get_similars_messages_from_vector, build_similarity_query
+from api.services.embedding_store import COMPACT_COLUMNS, create_compact_column, drop_compact_column
+
+
+def migrate(conn, kind, index=True):
+    """
+    Ajoute la copie compacte du vecteur à toutes les lignes de embedding et affiche la taille de la table.
+
+    Args:
+        conn: Connexion à la base de données.
+        kind (str): "halfvec" ou "bit".
+        index (bool, optional): Créer l'index HNSW de la copie compacte. Defaults to True.
+    """
+    start = time.time()
+    create_compact_column(conn, kind, index=index)
+    print(f"Colonne {COMPACT_COLUMNS[kind]['column']} ajoutée en {time.time() - start:.1f} secondes")
+    print_sizes(conn)
+
+def print_sizes(conn):
+    """
+    Affiche la taille de la table embedding et de ses index.
+
+    Args:
+        conn: Connexion à la base de données.
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT c.relname, pg_size_pretty(pg_relation_size(c.oid))
+            FROM pg_class c
+            WHERE c.relname = 'embedding'
+               OR c.oid IN (SELECT indexrelid FROM pg_index WHERE indrelid = 'embedding'::regclass)
+            ORDER BY pg_relation_size(c.oid) DESC
+            """)
+        for name, size in cur.fetchall():
+            print(f"{name}: {size}")
+
+def sample_query_vectors(conn, sample_size):
+    """
+    Tire des vecteurs de la table embedding, utilisés comme questions de test.
+
+    Args:
+        conn: Connexion à la base de données.
+        sample_size (int): Nombre de vecteurs.
+
+    Returns:
+        list[str]: Vecteurs au format pgvector.
+    """
+    with conn.cursor() as cur:
+        cur.execute("SELECT vector::text FROM embedding ORDER BY random() LIMIT %s", (sample_size,))
+        return [row[0] for row in cur.fetchall()]
+
+def exact_search_ids(conn, vector, k, course_name=None):
+    """
+    Recherche exacte des k plus proches voisins : les index ANN sont désactivés, tous les vecteurs sont comparés.
+
+    Args:
+        conn: Connexion à la base de données.
+        vector (str): Vecteur de la question au format pgvector.
+        k (int): Nombre de voisins.
+        course_name (str, optional): Restreindre la recherche à un cours. Defaults to None.
+
+    Returns:
+        set[str]: Ids des k documents les plus proches.
+    """
+    params = {"vector": vector, "candidates": k, "rescore": k, "course_name": course_name, "exclude_id": None, "limit": k}
+    with conn.cursor() as cur:
+        cur.execute("SET LOCAL enable_indexscan = off")
+        cur.execute(build_similarity_query(course_name, exact=True), params)
+        ids = {row[0] for row in cur.fetchall()}
+    conn.rollback()
+    return ids
+
+def recall(conn, kind, sample_size=100, k=10, course_name=None):
+    """
+    Mesure le recall@k de la recherche sur copie compacte par rapport à la recherche exacte (sans index ANN).
+
+    Args:
+        conn: Connexion à la base de données.
+        kind (str): "halfvec" ou "bit".
+        sample_size (int, optional): Nombre de questions. Defaults to 100.
+        k (int, optional): Nombre de résultats comparés. Defaults to 10.
+        course_name (str, optional): Restreindre la recherche à un cours. Defaults to None.
+
+    Returns:
+        dict: Recall moyen et minimal, temps moyen de chaque recherche.
+    """
+    vectors = sample_query_vectors(conn, sample_size)
+    recalls = []
+    timings = {"exact": 0.0, kind: 0.0}
+    for vector in vectors:
+        start = time.time()
+        exact = exact_search_ids(conn, vector, k, course_name=course_name)
+        timings["exact"] += time.time() - start
+        start = time.time()
+        approx = {doc.id for doc in get_similars_messages_from_vector(conn, vector, limit=k, course_name=course_name, compact=kind)}
+        timings[kind] += time.time() - start
+        if exact:
+            recalls.append(len(exact & approx) / len(exact))
+
+    report = {
+        "compact": kind,
+        "queries": len(recalls),
+        f"recall@{k}": sum(recalls) / len(recalls) if recalls else None,
+        f"min_recall@{k}": min(recalls) if recalls else None,
+        "exact_ms": 1000 * timings["exact"] / len(vectors) if vectors else None,
+        f"{kind}_ms": 1000 * timings[kind] / len(vectors) if vectors else None,
+    }
+    for key, value in report.items():
+        print(f"{key}: {value}")
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Copie compacte (halfvec ou bit) des embeddings : migration et mesure du recall.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    migrate_parser = subparsers.add_parser("migrate", help="Ajoute la copie compacte aux lignes existantes")
+    migrate_parser.add_argument("--type", choices=list(COMPACT_COLUMNS), required=True)
+    migrate_parser.add_argument("--no-index", action="store_true", help="Ne pas créer l'index HNSW")
+
+    drop_parser = subparsers.add_parser("drop", help="Supprime la copie compacte")
+    drop_parser.add_argument("--type", choices=list(COMPACT_COLUMNS), required=True)
+
+    recall_parser = subparsers.add_parser("recall", help="Compare la recherche compacte à la recherche exacte")
+    recall_parser.add_argument("--type", choices=list(COMPACT_COLUMNS), required=True)
+    recall_parser.add_argument("--sample", type=int, default=100, help="Nombre de questions")
+    recall_parser.add_argument("--k", type=int, default=10, help="Nombre de résultats comparés")
+    recall_parser.add_argument("--course", default=None, help="Nom du cours")
+
+    args = parser.parse_args()
+    conn = connect_to_db()
+    if not conn:
+        print("Failed to connect to the database.")
+        sys.exit(1)
+    try:
+        if args.command == "migrate":
+            migrate(conn, args.type, index=not args.no_index)
+        elif args.command == "drop":
+            drop_compact_column(conn, args.type)
+            print_sizes(conn)
+        else:
+            recall(conn, args.type, sample_size=args.sample, k=args.k, course_name=args.course)
+    finally:
+        conn.close()
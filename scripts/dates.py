@@ -1,22 +1,17 @@
 import json
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from api.services.thread_tree import iter_thread_messages
 from datetime import datetime
 
 # Charger le fichier ligne par ligne
 with open('MOOC_forum.json', 'r', encoding='utf-8') as f:
     data = [json.loads(line) for line in f]
 
-# Fonction récursive pour récupérer toutes les dates de création
+# Récupérer toutes les dates de création d'un thread et de ses réponses
 def collect_dates(thread_content):
-    dates = []
-    if 'created_at' in thread_content:
-        dates.append(thread_content['created_at'])
-    if 'children' in thread_content and thread_content['children']:
-        for child in thread_content['children']:
-            if 'content' in child:
-                dates.extend(collect_dates(child['content']))
-            elif 'created_at' in child:
-                dates.append(child['created_at'])
-    return dates
+    return [message['created_at'] for message, _, _ in iter_thread_messages(thread_content) if 'created_at' in message]
 
 # Récupérer toutes les dates
 all_dates = []
@@ -0,0 +1,115 @@
+import os
+import sys
+import json
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from api import config
+from api.services.database_helper import connect_to_db, build_similarity_query
+from api.services.embedding_store import COMPACT_COLUMNS, list_vector_indexes, set_search_params
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "explain")
+
+
+def iter_plan_nodes(plan):
+    """Parcourt tous les nœuds d'un plan EXPLAIN au format JSON."""
+    stack = [plan]
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(node.get("Plans", []))
+
+def explain(conn, query, params):
+    """
+    Exécute EXPLAIN ANALYZE sur une requête de similarité.
+
+    Args:
+        conn: Connexion à la base de données.
+        query (str): Requête construite par build_similarity_query.
+        params (dict): Paramètres nommés de la requête.
+
+    Returns:
+        dict: Le plan (nœud racine) au format JSON.
+    """
+    with conn.cursor() as cur:
+        set_search_params(cur, config.EMBEDDING_EF_SEARCH, config.EMBEDDING_IVFFLAT_PROBES)
+        cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + query.rstrip().rstrip(";"), params)
+        plan = cur.fetchone()[0]
+    conn.rollback()
+    return plan[0] if isinstance(plan, list) else json.loads(plan)[0]
+
+def check(conn, course_name=None, limit=10, save=True):
+    """
+    Vérifie que chaque variante de la requête de similarité passe par un index ANN.
+
+    Args:
+        conn: Connexion à la base de données.
+        course_name (str, optional): Cours utilisé pour la variante filtrée. Defaults to le premier cours.
+        limit (int, optional): Nombre de résultats demandés. Defaults to 10.
+        save (bool, optional): Enregistrer les plans dans data/explain/. Defaults to True.
+
+    Returns:
+        bool: True si toutes les variantes utilisent un index ANN.
+    """
+    ann_indexes = {index["name"] for index in list_vector_indexes(conn)}
+    if not ann_indexes:
+        print("Aucun index ANN : lancer scripts/vector_index.py create")
+        return False
+    with conn.cursor() as cur:
+        cur.execute("SELECT vector::text FROM embedding LIMIT 1")
+        vector = cur.fetchone()[0]
+        if course_name is None:
+            cur.execute("SELECT course_name FROM embedding WHERE course_name IS NOT NULL LIMIT 1")
+            course_name = cur.fetchone()[0]
+        cur.execute("SELECT column_name FROM information_schema.columns WHERE table_name = 'embedding'")
+        columns = {row[0] for row in cur.fetchall()}
+    conn.rollback()
+
+    scenarios = {
+        "all_courses": dict(),
+        "course_filter": dict(course_name=course_name),
+        "exclude_id": dict(exclude_id="-"),
+    }
+    if config.EMBEDDING_CHUNKING:
+        scenarios["chunks"] = dict(chunking=True)
+    for kind, compact in COMPACT_COLUMNS.items():
+        if compact["column"] in columns:
+            scenarios[f"compact_{kind}"] = dict(compact=compact)
+
+    ok = True
+    if save:
+        os.makedirs(FIXTURES_DIR, exist_ok=True)
+    for name, options in scenarios.items():
+        candidates = limit * config.EMBEDDING_OVERSAMPLING if options.get("course_name") else limit + 1
+        params = {
+            "vector": vector,
+            "course_name": options.get("course_name"),
+            "exclude_id": options.get("exclude_id"),
+            "candidates": candidates,
+            "rescore": candidates * config.EMBEDDING_RESCORE_FACTOR,
+            "limit": limit,
+        }
+        plan = explain(conn, build_similarity_query(**options), params)
+        used = sorted({node["Index Name"] for node in iter_plan_nodes(plan["Plan"]) if node.get("Index Name") in ann_indexes})
+        ok = ok and bool(used)
+        print(f"{'OK ' if used else 'ÉCHEC'} {name}: index {', '.join(used) or 'aucun'}, {plan['Execution Time']:.1f} ms")
+        if save:
+            with open(os.path.join(FIXTURES_DIR, f"{name}.json"), "w", encoding="utf-8") as f:
+                json.dump(plan, f, indent=2)
+    return ok
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vérifie par EXPLAIN ANALYZE que les requêtes de similarité utilisent l'index ANN.")
+    parser.add_argument("--course", default=None, help="Cours utilisé pour la variante filtrée")
+    parser.add_argument("--limit", type=int, default=10, help="Nombre de résultats demandés")
+    parser.add_argument("--no-save", action="store_true", help="Ne pas enregistrer les plans dans data/explain/")
+    args = parser.parse_args()
+    conn = connect_to_db()
+    if not conn:
+        print("Failed to connect to the database.")
+        sys.exit(1)
+    try:
+        success = check(conn, course_name=args.course, limit=args.limit, save=not args.no_save)
+    finally:
+        conn.close()
+    sys.exit(0 if success else 1)
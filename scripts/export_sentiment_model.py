@@ -0,0 +1,107 @@
+import os
+import sys
+import time
+import argparse
+
+#MongoDB
+from pymongo import MongoClient
+
+#Environnement
+from dotenv import load_dotenv
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from api import config
+from api.services.sentiment import analyse_sentiment_batch, get_sentiment_model
+from api.services.sentiment_backends import export_artifacts
+
+load_dotenv()
+
+
+def export(backend, model_name=None):
+    """
+    Exporte (quantification int8 ou ONNX) le modèle de sentiment et met en cache les artefacts sur disque.
+
+    Args:
+        backend (str): "torch_int8" ou "onnx".
+        model_name (str, optional): Nom du modèle. Defaults to config.SENTIMENT_MODEL_NAME.
+    """
+    model_name = model_name or config.SENTIMENT_MODEL_NAME
+    tokenizer, _, _ = get_sentiment_model(model_name, backend="torch")
+    start = time.time()
+    path = export_artifacts(model_name, backend, tokenizer)
+    print(f"Export {backend} terminé en {time.time() - start:.1f} secondes : {path} ({os.path.getsize(path) / 1024 ** 2:.1f} Mo)")
+
+def sample_bodies(sample_size):
+    """
+    Tire un échantillon aléatoire de messages non vides dans G1.documents.
+
+    Args:
+        sample_size (int): Taille de l'échantillon.
+
+    Returns:
+        list[str]: Contenus des messages.
+    """
+    client = MongoClient(os.getenv("MONGO_URL"))
+    cursor = client['G1']['documents'].aggregate([
+        {"$match": {"body": {"$nin": [None, ""]}}},
+        {"$sample": {"size": sample_size}},
+        {"$project": {"body": 1}},
+    ])
+    return [doc["body"] for doc in cursor]
+
+def parity(backend, sample_size=500, model_name=None):
+    """
+    Compare les labels d'un backend à ceux du modèle torch fp32 sur un échantillon de documents.
+
+    Args:
+        backend (str): Backend à évaluer ("torch_int8" ou "onnx").
+        sample_size (int, optional): Nombre de documents. Defaults to 500.
+        model_name (str, optional): Nom du modèle. Defaults to config.SENTIMENT_MODEL_NAME.
+
+    Returns:
+        dict: Taux d'accord des labels, écart moyen et maximal des scores, temps d'inférence de chaque backend.
+    """
+    model_name = model_name or config.SENTIMENT_MODEL_NAME
+    bodies = sample_bodies(sample_size)
+
+    timings = {}
+    results = {}
+    for name in ("torch", backend):
+        get_sentiment_model(model_name, backend=name)
+        start = time.time()
+        results[name] = analyse_sentiment_batch(bodies, model_name=model_name, backend=name)
+        timings[name] = time.time() - start
+
+    reference, candidate = results["torch"], results[backend]
+    agreements = sum(1 for a, b in zip(reference, candidate) if a["label"] == b["label"])
+    score_gaps = [abs(a["score"] - b["score"]) for a, b in zip(reference, candidate) if a["label"] == b["label"]]
+    report = {
+        "backend": backend,
+        "documents": len(bodies),
+        "label_agreement": agreements / len(bodies) if bodies else None,
+        "mean_score_gap": sum(score_gaps) / len(score_gaps) if score_gaps else None,
+        "max_score_gap": max(score_gaps) if score_gaps else None,
+        "torch_seconds": timings["torch"],
+        f"{backend}_seconds": timings[backend],
+        "speedup": timings["torch"] / timings[backend] if timings[backend] else None,
+    }
+    for key, value in report.items():
+        print(f"{key}: {value}")
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export et contrôle de parité des backends du modèle de sentiment.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Quantifie ou exporte le modèle et met en cache les artefacts")
+    export_parser.add_argument("--backend", choices=["torch_int8", "onnx"], required=True)
+
+    parity_parser = subparsers.add_parser("parity", help="Compare les labels d'un backend au modèle fp32")
+    parity_parser.add_argument("--backend", choices=["torch_int8", "onnx"], required=True)
+    parity_parser.add_argument("--sample", type=int, default=500, help="Nombre de documents à comparer")
+
+    args = parser.parse_args()
+    if args.command == "export":
+        export(args.backend)
+    else:
+        parity(args.backend, sample_size=args.sample)
@@ -0,0 +1,81 @@
+import os
+import sys
+import time
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from api import config
+from api.services.database_helper import connect_to_db, get_similars_messages_from_vector
+from api.services.embedding_mmap import MemmapVectorIndex, export_vector_index
+
+
+def bench(conn, path=None, sample_size=100, k=10, course_name=None):
+    """
+    Compare la recherche sur l'index memory-mappé à la recherche PostgreSQL : recouvrement des résultats et latence.
+
+    Args:
+        conn: Connexion à la base de données.
+        path (str, optional): Chemin de l'index, sans extension. Defaults to config.EMBEDDING_MMAP_PATH.
+        sample_size (int, optional): Nombre de questions (vecteurs tirés de la table). Defaults to 100.
+        k (int, optional): Nombre de résultats comparés. Defaults to 10.
+        course_name (str, optional): Restreindre la recherche à un cours. Defaults to None.
+
+    Returns:
+        dict: Recouvrement moyen avec PostgreSQL et temps moyen de chaque backend en millisecondes.
+    """
+    index = MemmapVectorIndex(path or config.EMBEDDING_MMAP_PATH)
+    with conn.cursor() as cur:
+        cur.execute("SELECT vector::text FROM embedding ORDER BY random() LIMIT %s", (sample_size,))
+        vectors = [[float(x) for x in row[0].strip("[]").split(",")] for row in cur.fetchall()]
+    conn.rollback()
+
+    overlaps = []
+    timings = {"postgres": 0.0, "mmap": 0.0}
+    for vector in vectors:
+        start = time.time()
+        expected = {doc.id for doc in get_similars_messages_from_vector(conn, vector, limit=k, course_name=course_name, backend="postgres")}
+        timings["postgres"] += time.time() - start
+        start = time.time()
+        found = {doc.id for doc in index.search(vector, k, course_name=course_name)}
+        timings["mmap"] += time.time() - start
+        if expected:
+            overlaps.append(len(expected & found) / len(expected))
+
+    report = {
+        "queries": len(vectors),
+        f"overlap@{k}": sum(overlaps) / len(overlaps) if overlaps else None,
+        "postgres_ms": 1000 * timings["postgres"] / len(vectors) if vectors else None,
+        "mmap_ms": 1000 * timings["mmap"] / len(vectors) if vectors else None,
+    }
+    for key, value in report.items():
+        print(f"{key}: {value}")
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index memory-mappé des embeddings pour la recherche sans PostgreSQL (EMBEDDING_SEARCH_BACKEND=mmap).")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Exporte la table embedding dans l'index")
+    export_parser.add_argument("--path", default=None, help="Chemin de l'index sans extension (défaut : EMBEDDING_MMAP_PATH)")
+    export_parser.add_argument("--dtype", choices=["float32", "float16"], default="float32")
+
+    bench_parser = subparsers.add_parser("bench", help="Compare l'index à la recherche PostgreSQL")
+    bench_parser.add_argument("--path", default=None, help="Chemin de l'index sans extension (défaut : EMBEDDING_MMAP_PATH)")
+    bench_parser.add_argument("--sample", type=int, default=100, help="Nombre de questions")
+    bench_parser.add_argument("--k", type=int, default=10, help="Nombre de résultats comparés")
+    bench_parser.add_argument("--course", default=None, help="Nom du cours")
+
+    args = parser.parse_args()
+    conn = connect_to_db()
+    if not conn:
+        print("Failed to connect to the database.")
+        sys.exit(1)
+    try:
+        if args.command == "export":
+            start = time.time()
+            metadata = export_vector_index(conn, args.path, dtype=args.dtype)
+            print(f"{metadata['count']} vecteurs ({metadata['dtype']}, {metadata['courses']} cours) exportés en {time.time() - start:.1f} secondes")
+        else:
+            bench(conn, args.path, sample_size=args.sample, k=args.k, course_name=args.course)
+    finally:
+        conn.close()
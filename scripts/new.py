@@ -4,6 +4,8 @@ import json
 from pymongo import MongoClient
 from dotenv import load_dotenv
 import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from api.services.thread_tree import iter_thread_messages, message_fields
 
 # Charger les variables d'environnement (si un fichier .env existe)
 load_dotenv()
@@ -222,67 +224,35 @@ def run_analysis():
             print(f"Erreur lors du calcul de la période d'activité par cours: {e}")
 
 
-        # --- 7. Traitement récursif et insertion dans 'documents' ---
-        print("\n--- Traitement récursif et insertion/mise à jour dans la collection 'documents' ---")
+        # --- 7. Mise à plat des threads et insertion dans 'documents' ---
+        print("\n--- Mise à plat des threads et insertion/mise à jour dans la collection 'documents' ---")
 
-        # Définir la fonction récursive à l'intérieur pour qu'elle ait accès à `documents_collection`
-        def process_and_insert_document(content_data, parent_id=None):
+        def process_and_insert_document(content_data):
             """
-            Traite un noeud de contenu (post, commentaire, réponse) et l'insère
-            dans la collection 'documents' s'il n'existe pas déjà.
-            Gère récursivement les enfants et les réponses.
+            Insère dans la collection 'documents' un post et toutes ses réponses (children,
+            endorsed_responses, non_endorsed_responses), à n'importe quelle profondeur.
+            Chaque message est enregistré sans ses listes de réponses, avec l'id de son parent.
             """
             if not isinstance(content_data, dict):
-                #print(f"  Donnée invalide rencontrée (pas un dictionnaire): {content_data}")
                 return # Ignorer si ce n'est pas un dictionnaire
 
-            doc_id = content_data.get("id")
-            if not doc_id:
-                #print("  Document sans ID trouvé, impossible de traiter.")
-                return # Impossible de traiter sans ID
+            for message, depth, parent_id in iter_thread_messages(content_data):
+                doc_id = message.get("id")
+                if not doc_id:
+                    continue # Impossible de traiter sans ID
 
-            # Préparer le document à insérer/mettre à jour
-            document_to_insert = content_data.copy() # Travailler sur une copie
-            document_to_insert['_id'] = doc_id # Utiliser l'id comme _id MongoDB
+                document_to_insert = message_fields(message)
+                document_to_insert['_id'] = doc_id # Utiliser l'id comme _id MongoDB
+                if parent_id:
+                    document_to_insert["parent_id"] = parent_id
 
-            # Ajouter parent_id si ce document est une réponse/commentaire (profondeur > 0 ou via les listes de réponses)
-            # La condition depth == 1 semble spécifique et pourrait être généralisée.
-            # Ici, on se base sur le fait qu'elle est appelée récursivement avec un parent_id.
-            if parent_id:
-                 document_to_insert["parent_id"] = parent_id
+                try:
+                    # Remplacer l'existant ou insérer s'il n'existe pas
+                    documents_collection.replace_one({'_id': doc_id}, document_to_insert, upsert=True)
+                except Exception as e:
+                    print(f"  Erreur lors de l'upsert du document {doc_id}: {e}")
 
-            # Vérifier si le document existe déjà
-            # Utiliser upsert=True est plus efficace que find_one + insert_one
-            try:
-                # Remplacer l'existant ou insérer s'il n'existe pas
-                documents_collection.replace_one(
-                    {'_id': doc_id},        # Filtre pour trouver le document par son ID
-                    document_to_insert,     # Le nouveau document qui remplacera l'ancien ou sera inséré
-                    upsert=True             # Option pour insérer si le document n'est pas trouvé
-                )
-            except Exception as e:
-                print(f"  Erreur lors de l'upsert du document {doc_id}: {e}")
-                # Peut-être décider de continuer avec les enfants ou d'arrêter ici
-
-            # Traiter récursivement les sous-éléments
-            # Correction des clés potentielles (avec/sans 's') et vérification si c'est une liste
-            children = content_data.get("children", [])
-            if isinstance(children, list):
-                for child_doc in children:
-                    process_and_insert_document(child_doc, parent_id=doc_id)
-
-            # Correction des noms de clés pour les réponses
-            endorsed = content_data.get('endorsed_responses', content_data.get('endorsed_reponses', []))
-            if isinstance(endorsed, list):
-                for endorsed_resp in endorsed:
-                    process_and_insert_document(endorsed_resp, parent_id=doc_id)
-
-            non_endorsed = content_data.get('non_endorsed_responses', content_data.get('non_endorsed_reponses', []))
-            if isinstance(non_endorsed, list):
-                for non_endorsed_resp in non_endorsed:
-                    process_and_insert_document(non_endorsed_resp, parent_id=doc_id)
-
-        # --- Exécution du traitement récursif ---
+        # --- Exécution de la mise à plat ---
         try:
             # Récupérer seulement le champ 'content' des posts initiaux
             initial_posts = posts_collection.find(
@@ -297,7 +267,7 @@ def run_analysis():
             for i, doc in enumerate(initial_posts):
                 content = doc.get("content")
                 if content: # Vérifier si le champ content existe
-                    process_and_insert_document(content) # Lancer la récursion pour chaque post initial
+                    process_and_insert_document(content) # Insérer le post et ses réponses
                     count += 1
                 # Afficher la progression
                 if (i + 1) % 100 == 0 or (i + 1) == total_posts:
@@ -305,10 +275,10 @@ def run_analysis():
                      print(f"  Progression: {i + 1}/{total_posts} ({progress:.2f}%)", end='\r')
                      sys.stdout.flush() # Forcer l'affichage sur la même ligne
 
-            print(f"\nTraitement récursif terminé. {count} posts initiaux traités.")
+            print(f"\nMise à plat terminée. {count} posts initiaux traités.")
 
         except Exception as e:
-            print(f"\nErreur lors du traitement récursif et de l'insertion: {e}")
+            print(f"\nErreur lors de la mise à plat et de l'insertion: {e}")
 
 
     except Exception as e:
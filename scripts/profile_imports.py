@@ -0,0 +1,111 @@
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_MODULES = ["api.services.embedding", "api.services.sentiment", "api.routers.endpoints"]
+
+# Pic de mémoire en Mo affiché par le sous-processus : resource n'existe pas sous Windows (psutil ou None),
+# et ru_maxrss est en octets sous macOS, en Ko ailleurs
+MAX_RSS_SNIPPET = """
+try:
+    import resource
+except ImportError:
+    try:
+        import psutil
+        print(psutil.Process().memory_info().rss / 1024 ** 2)
+    except ImportError:
+        print(None)
+else:
+    import sys
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(max_rss / 1024 ** 2 if sys.platform == "darwin" else max_rss / 1024)
+"""
+
+
+def profile_module(module):
+    """
+    Importe un module dans un nouveau processus Python avec -X importtime et mesure son coût.
+
+    Args:
+        module (str): Nom du module (ex: api.services.embedding).
+
+    Returns:
+        dict: Temps total d'import, mémoire maximale du processus et paquets de premier niveau les plus coûteux.
+    """
+    code = f"import {module}\n{MAX_RSS_SNIPPET}"
+    start = time.time()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT_DIR, capture_output=True, text=True)
+    wall = time.time() - start
+
+    packages = {}
+    total_us = None
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        cumulative = int(cumulative)
+        name = name.strip()
+        if name == module:
+            total_us = cumulative
+        # Coût d'un paquet tiers = cumul de son import le plus coûteux (les paquets importés par un autre y sont inclus)
+        top = name.split(".")[0]
+        if top != "api":
+            packages[top] = max(packages.get(top, 0), cumulative)
+
+    if result.returncode != 0:
+        errors = [line for line in result.stderr.strip().splitlines() if not line.startswith("import time:")]
+        error = errors[-1] if errors else "erreur inconnue"
+        return {"module": module, "error": error, "wall_s": round(wall, 2)}
+    max_rss = result.stdout.strip().splitlines()[-1]
+    return {
+        "module": module,
+        "import_s": round(total_us / 1e6, 3) if total_us is not None else None,
+        "wall_s": round(wall, 2),
+        "max_rss_mb": None if max_rss == "None" else round(float(max_rss), 1),
+        "heaviest": dict(sorted(packages.items(), key=lambda item: item[1], reverse=True)[:8]),
+    }
+
+def print_report(reports, before=None):
+    """
+    Affiche le coût d'import de chaque module, avec l'écart par rapport à un profil précédent.
+
+    Args:
+        reports (list[dict]): Résultats de profile_module.
+        before (list[dict], optional): Profil précédent (option --compare). Defaults to None.
+    """
+    before = {report["module"]: report for report in before or []}
+    for report in reports:
+        print(f"\n{report['module']}")
+        if "error" in report:
+            print(f"  erreur: {report['error']}")
+            continue
+        previous = before.get(report["module"], {})
+        for key in ("import_s", "wall_s", "max_rss_mb"):
+            line = f"  {key}: {report[key]}"
+            if previous.get(key) is not None and report[key] is not None:
+                line += f" (avant: {previous[key]}, écart: {report[key] - previous[key]:+.2f})"
+            print(line)
+        print("  paquets les plus coûteux (s): " + ", ".join(f"{name}={us / 1e6:.2f}" for name, us in report["heaviest"].items()))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mesure le temps et la mémoire nécessaires pour importer les modules de l'API.")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES, help="Modules à importer")
+    parser.add_argument("--save", default=None, help="Enregistre le profil dans un fichier JSON")
+    parser.add_argument("--compare", default=None, help="Profil JSON précédent (ex: enregistré avant une modification)")
+    args = parser.parse_args()
+
+    reports = [profile_module(module) for module in args.modules]
+    before = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            before = json.load(f)
+    print_report(reports, before)
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(reports, f, indent=2)
@@ -1,22 +1,16 @@
 import json
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from api.services.thread_tree import iter_thread_messages
 
 # Charger le fichier ligne par ligne
 with open('MOOC_forum.json', 'r', encoding='utf-8') as f:
     data = [json.loads(line) for line in f]
 
-# Fonction récursive pour calculer la profondeur maximale d'un thread
-def profondeur_max(thread_content, niveau=1):
-    max_niveau = niveau
-    if 'children' in thread_content and thread_content['children']:
-        for child in thread_content['children']:
-            if 'content' in child:
-                profondeur = profondeur_max(child['content'], niveau + 1)
-                if profondeur > max_niveau:
-                    max_niveau = profondeur
-            else:
-                if niveau + 1 > max_niveau:
-                    max_niveau = niveau + 1
-    return max_niveau
+# Calculer la profondeur maximale d'un thread (le message principal est au niveau 1)
+def profondeur_max(thread_content):
+    return max(depth for _, depth, _ in iter_thread_messages(thread_content)) + 1
 
 # Calculer la profondeur maximale pour chaque thread
 profondeurs = []
@@ -1,20 +1,16 @@
 import json
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from api.services.thread_tree import iter_thread_messages
 
 # Charger le fichier ligne par ligne
 with open('MOOC_forum.json', 'r', encoding='utf-8') as f:
     data = [json.loads(line) for line in f]
 
-# Fonction récursive pour compter les messages dans un thread
+# Compter les messages d'un thread (message principal et toutes les réponses)
 def count_messages(thread_content):
-    count = 1  # le message principal
-    if 'children' in thread_content and thread_content['children']:
-        for child in thread_content['children']:
-            # Certains enfants peuvent ne pas avoir de 'content', on vérifie
-            if 'content' in child:
-                count += count_messages(child['content'])
-            else:
-                count += 1  # Si pas de 'content', on compte juste le message
-    return count
+    return sum(1 for _ in iter_thread_messages(thread_content))
 
 # Calculer la moyenne
 total_messages = 0
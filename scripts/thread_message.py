@@ -1,19 +1,16 @@
 import json
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from api.services.thread_tree import iter_thread_messages
 
 # Charger le fichier ligne par ligne
 with open('MOOC_forum.json', 'r', encoding='utf-8') as f:
     data = [json.loads(line) for line in f]
 
-# Fonction récursive pour compter tous les messages d'un thread
+# Compter tous les messages d'un thread (message principal et toutes les réponses)
 def count_messages(thread_content):
-    count = 1  # message principal
-    if 'children' in thread_content and thread_content['children']:
-        for child in thread_content['children']:
-            if 'content' in child:
-                count += count_messages(child['content'])
-            else:
-                count += 1
-    return count
+    return sum(1 for _ in iter_thread_messages(thread_content))
 
 # Dictionnaires pour stocker les résultats
 threads_par_cours = {}
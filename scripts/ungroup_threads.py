@@ -1,6 +1,9 @@
 from pymongo import MongoClient
 import os
+import sys
 from dotenv import load_dotenv
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from api.services.thread_tree import iter_thread_messages, message_fields
 load_dotenv()
 
 def ungroup_threads_message(mongo_url, collection_name):
@@ -16,33 +19,18 @@ def ungroup_threads_message(mongo_url, collection_name):
     projection=project
     )
 
-    def stevefunk(content, parent_id=None):
-        id = content.get("id", "")
-        
-        children = content.get("children", [])
-        endorsed_responses = content.get('endorsed_reponses',[])
-        non_endorsed_responses = content.get('non_endorsed_reponses',[])
-        
-        content['_id'] = id
-        if content.get("depth", 0) == 1:
-            content["parent_id"] = parent_id
-
-        result = client[collection_name]['documents'].find_one({'_id' : id})
-        if result is None:
-            client[collection_name]['documents'].insert_one(content)
-        
-        for doc in children:
-            stevefunk(doc, parent_id=id)
-        
-        for doc in endorsed_responses:
-            stevefunk(doc, parent_id=id)
+    for doc in result:
+        for content, depth, parent_id in iter_thread_messages(doc["content"]):
+            id = content.get("id", "")
 
-        for doc in non_endorsed_responses:
-            stevefunk(doc, parent_id=id)
+            message = message_fields(content)
+            message['_id'] = id
+            if content.get("depth", 0) == 1:
+                message["parent_id"] = parent_id
 
-    for doc in result:
-        content = doc["content"]
-        stevefunk(content)
+            existing = client[collection_name]['documents'].find_one({'_id' : id}, {'_id': 1})
+            if existing is None:
+                client[collection_name]['documents'].insert_one(message)
 
 if __name__ == "__main__":
     mongo_url = os.getenv("MONGO_URL")
@@ -0,0 +1,162 @@
+import os
+import sys
+import time
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from api.services.database_helper import connect_to_db
+from api.services.embedding_store import create_vector_index, create_course_vector_indexes, drop_vector_index, list_vector_indexes, set_search_params, vector_index_name
+
+
+def rebuild(conn, method, table):
+    """
+    Reconstruit un index ANN sans bloquer les lectures ni les écritures (après une grosse ingestion par exemple).
+
+    Args:
+        conn: Connexion à la base de données.
+        method (str): "hnsw" ou "ivfflat".
+        table (str): "embedding" ou "embedding_chunk".
+    """
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute(f"REINDEX INDEX CONCURRENTLY {vector_index_name(table, method)}")
+    conn.autocommit = False
+
+def search_ids(conn, table, vector, k, exact=False, ef_search=None, probes=None):
+    """
+    Exécute une recherche des k plus proches voisins, par l'index ANN ou exacte (parcours complet).
+
+    Args:
+        conn: Connexion à la base de données.
+        table (str): "embedding" ou "embedding_chunk".
+        vector (str): Vecteur de la question au format pgvector.
+        k (int): Nombre de voisins.
+        exact (bool, optional): Désactiver les index pour obtenir le résultat exact. Defaults to False.
+        ef_search (int, optional): HNSW : candidats examinés. Defaults to None.
+        probes (int, optional): IVFFlat : listes parcourues. Defaults to None.
+
+    Returns:
+        tuple: (ids trouvés, durée en secondes)
+    """
+    with conn.cursor() as cur:
+        if exact:
+            cur.execute("SET LOCAL enable_indexscan = off")
+        set_search_params(cur, ef_search, probes)
+        start = time.time()
+        cur.execute(f"SELECT id FROM {table} ORDER BY vector <=> %s::vector LIMIT %s", (vector, k))
+        ids = [row[0] for row in cur.fetchall()]
+        elapsed = time.time() - start
+    conn.rollback()
+    return ids, elapsed
+
+def report(conn, method, table="embedding", sample_size=50, k=10, values=None):
+    """
+    Compare le recall@k et la latence de l'index ANN à la recherche exacte, pour plusieurs réglages de recherche.
+
+    Args:
+        conn: Connexion à la base de données.
+        method (str): "hnsw" (réglage ef_search) ou "ivfflat" (réglage probes).
+        table (str, optional): "embedding" ou "embedding_chunk". Defaults to "embedding".
+        sample_size (int, optional): Nombre de questions (vecteurs tirés de la table). Defaults to 50.
+        k (int, optional): Nombre de voisins comparés. Defaults to 10.
+        values (list[int], optional): Valeurs de ef_search ou probes testées. Defaults to une gamme adaptée à la méthode.
+
+    Returns:
+        list[dict]: Une ligne par réglage avec recall moyen et latences moyenne et p95 en millisecondes.
+    """
+    values = values or ([10, 20, 40, 80, 160, 320] if method == "hnsw" else [1, 2, 4, 8, 16, 32])
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT vector::text FROM {table} ORDER BY random() LIMIT %s", (sample_size,))
+        vectors = [row[0] for row in cur.fetchall()]
+    conn.rollback()
+
+    exact_results = []
+    exact_timings = []
+    for vector in vectors:
+        ids, elapsed = search_ids(conn, table, vector, k, exact=True)
+        exact_results.append(set(ids))
+        exact_timings.append(elapsed)
+
+    def summary(setting, recalls, timings):
+        timings = sorted(timings)
+        return {
+            "setting": setting,
+            f"recall@{k}": sum(recalls) / len(recalls) if recalls else None,
+            "mean_ms": 1000 * sum(timings) / len(timings) if timings else None,
+            "p95_ms": 1000 * timings[int(0.95 * (len(timings) - 1))] if timings else None,
+        }
+
+    rows = [summary("exact", [1.0] * len(vectors), exact_timings)]
+    parameter = "ef_search" if method == "hnsw" else "probes"
+    for value in values:
+        recalls = []
+        timings = []
+        for vector, expected in zip(vectors, exact_results):
+            ids, elapsed = search_ids(conn, table, vector, k, **{parameter: value})
+            timings.append(elapsed)
+            if expected:
+                recalls.append(len(expected & set(ids)) / len(expected))
+        rows.append(summary(f"{parameter}={value}", recalls, timings))
+
+    for row in rows:
+        print("  ".join(f"{key}: {value:.3f}" if isinstance(value, float) else f"{key}: {value}" for key, value in row.items()))
+    return rows
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gestion des index ANN (HNSW / IVFFlat) des tables d'embedding.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    create_parser = subparsers.add_parser("create", help="Crée un index")
+    create_parser.add_argument("--method", choices=["hnsw", "ivfflat"], default="hnsw")
+    create_parser.add_argument("--table", choices=["embedding", "embedding_chunk"], default="embedding")
+    create_parser.add_argument("--m", type=int, default=16, help="HNSW : voisins par nœud")
+    create_parser.add_argument("--ef-construction", type=int, default=64, help="HNSW : candidats à la construction")
+    create_parser.add_argument("--lists", type=int, default=None, help="IVFFlat : nombre de listes (défaut : lignes / 1000)")
+    create_parser.add_argument("--concurrently", action="store_true", help="Ne pas bloquer les écritures pendant la construction")
+    create_parser.add_argument("--maintenance-work-mem", default=None, help="Mémoire de construction (ex: 2GB)")
+    create_parser.add_argument("--per-course", action="store_true", help="Un index partiel par cours (table embedding)")
+    create_parser.add_argument("--min-rows", type=int, default=5000, help="--per-course : taille minimale d'un cours indexé")
+
+    for name, help in (("rebuild", "Reconstruit un index"), ("drop", "Supprime un index")):
+        subparser = subparsers.add_parser(name, help=help)
+        subparser.add_argument("--method", choices=["hnsw", "ivfflat"], default="hnsw")
+        subparser.add_argument("--table", choices=["embedding", "embedding_chunk"], default="embedding")
+
+    subparsers.add_parser("list", help="Liste les index existants")
+
+    report_parser = subparsers.add_parser("report", help="Recall et latence de l'index comparés à la recherche exacte")
+    report_parser.add_argument("--method", choices=["hnsw", "ivfflat"], default="hnsw")
+    report_parser.add_argument("--table", choices=["embedding", "embedding_chunk"], default="embedding")
+    report_parser.add_argument("--sample", type=int, default=50, help="Nombre de questions")
+    report_parser.add_argument("--k", type=int, default=10, help="Nombre de voisins comparés")
+    report_parser.add_argument("--values", type=int, nargs="*", default=None, help="Valeurs de ef_search (hnsw) ou probes (ivfflat)")
+
+    args = parser.parse_args()
+    conn = connect_to_db()
+    if not conn:
+        print("Failed to connect to the database.")
+        sys.exit(1)
+    try:
+        if args.command == "create":
+            if args.maintenance_work_mem:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT set_config('maintenance_work_mem', %s, false)", (args.maintenance_work_mem,))
+            start = time.time()
+            if args.per_course:
+                names = create_course_vector_indexes(conn, args.method, min_rows=args.min_rows, m=args.m, ef_construction=args.ef_construction)
+                print(f"{len(names)} index par cours créés en {time.time() - start:.1f} secondes")
+            else:
+                name = create_vector_index(conn, args.method, args.table, m=args.m, ef_construction=args.ef_construction,
+                                           lists=args.lists, concurrently=args.concurrently)
+                print(f"Index {name} créé en {time.time() - start:.1f} secondes")
+        elif args.command == "rebuild":
+            rebuild(conn, args.method, args.table)
+        elif args.command == "drop":
+            drop_vector_index(conn, args.method, args.table)
+        if args.command in ("create", "rebuild", "drop", "list"):
+            for index in list_vector_indexes(conn):
+                print(f"{index['name']} ({index['size']}): {index['definition']}")
+        else:
+            report(conn, args.method, args.table, sample_size=args.sample, k=args.k, values=args.values)
+    finally:
+        conn.close()